@@ -2,17 +2,17 @@ from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_moment import Moment
 from flask_mail import Mail
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_pagedown import PageDown
 
 from config import config
+from .routing import RoutingSQLAlchemy
 
 
 bootstrap = Bootstrap()
 mail = Mail()
 moment = Moment()
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 pagedown = PageDown()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -48,4 +48,22 @@ def create_app(config_name):
     login_manager.init_app(app)
     pagedown.init_app(app)
 
+    from .last_seen import last_seen_buffer
+    last_seen_buffer.init_app(app)
+
+    from .email import mail_dispatcher
+    mail_dispatcher.init_app(app)
+
+    from .compress import compress
+    compress.init_app(app)
+
+    from .graph import follow_graph
+    follow_graph.init_app(app)
+
+    from .profiling import query_profiler
+    query_profiler.init_app(app)
+
+    from .metrics import metrics
+    metrics.init_app(app)
+
     return app
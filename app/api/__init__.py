@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api_blueprint = Blueprint('api', __name__)
 
-from . import errors
\ No newline at end of file
+from . import authentication, errors, posts, users, comments, search
\ No newline at end of file
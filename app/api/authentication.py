@@ -1,16 +1,69 @@
-from flask import g
+import time
+from flask import g, jsonify, current_app
 from flask_httpauth import HTTPBasicAuth
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, BadSignature
 from ..models import *
+from ..cache import LRUCache
+from . import api_blueprint
+from .errors import unauthorized, forbidden
 
 auth = HTTPBasicAuth()
+token_cache = LRUCache(maxsize=4096)
+
+
+def verify_token(token):
+    """Return the id of the user an API token was issued to, or None.
+
+    Verified tokens are remembered until they expire, so repeated calls with
+    the same token skip the signature check as well as the database.
+    """
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    s = Serializer(current_app.config.get('SECRET_KEY'))
+    try:
+        data, header = s.loads(token.encode('utf-8'), return_header=True)
+    except BadSignature:
+        return None
+    if data.get('scope') != 'api' or 'id' not in data:
+        return None
+    token_cache.set(token, data['id'], ttl=header['exp'] - time.time())
+    return data['id']
 
 
 @auth.verify_password
-def verify_password(email, password):
-    if email == '':
+def verify_password(email_or_token, password):
+    if email_or_token == '':
         return False
-    user = User.query.filter_by(email=email).first()
+    if password == '':
+        user_id = verify_token(email_or_token)
+        g.current_user = load_user(user_id) if user_id is not None else None
+        g.token_used = True
+        return g.current_user is not None
+    user = User.query.filter_by(email=email_or_token).first()
     if not user:
         return False
     g.current_user = user
+    g.token_used = False
     return user.verify_password(password)
+
+
+@auth.error_handler
+def auth_error():
+    return unauthorized('Invalid credentials')
+
+
+@api_blueprint.before_request
+@auth.login_required
+def before_request():
+    if not g.current_user.confirmed:
+        return forbidden('Unconfirmed account')
+
+
+@api_blueprint.route('/tokens', methods=['POST'])
+def get_token():
+    if g.token_used:
+        return unauthorized('Invalid credentials')
+    expiration = current_app.config.get('FLASKY_API_TOKEN_EXPIRATION', 3600)
+    token = g.current_user.generate_token(expiration, extra_data={'scope': 'api'})
+    return jsonify({'token': token, 'expiration': expiration})
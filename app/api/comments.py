@@ -0,0 +1,39 @@
+from flask import request, jsonify, g, url_for
+
+from . import api_blueprint
+from .decorators import permission_required
+from .serialization import list_response, project, requested_fields
+from .. import db
+from ..models import Post, Comment, Permission
+
+
+@api_blueprint.route('/comments/')
+def get_comments():
+    return list_response('comments', Comment, Comment.query, (Comment.timestamp, Comment.id),
+                         'api.get_comments')
+
+
+@api_blueprint.route('/comments/<int:id>')
+def get_comment(id):
+    fields = requested_fields(Comment)
+    comment = project(Comment.query, Comment, fields).get_or_404(id)
+    return jsonify(comment.to_json(fields))
+
+
+@api_blueprint.route('/posts/<int:id>/comments/')
+def get_post_comments(id):
+    post = Post.query.options(db.load_only('id')).get_or_404(id)
+    return list_response('comments', Comment, post.comments, (Comment.timestamp, Comment.id),
+                         'api.get_post_comments', id=id)
+
+
+@api_blueprint.route('/posts/<int:id>/comments/', methods=['POST'])
+@permission_required(Permission.COMMENT)
+def new_post_comment(id):
+    post = Post.query.get_or_404(id)
+    comment = Comment.from_json(request.get_json(silent=True))
+    comment.author = g.current_user
+    comment.post = post
+    db.session.add(comment)
+    db.session.commit()
+    return jsonify(comment.to_json()), 201, {'Location': url_for('api.get_comment', id=comment.id)}
@@ -0,0 +1,16 @@
+import functools
+
+from flask import g
+
+from .errors import forbidden
+
+
+def permission_required(perm):
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_func(*args, **kwargs):
+            if not g.current_user.can(perm):
+                return forbidden('Insufficient permissions')
+            return f(*args, **kwargs)
+        return decorated_func
+    return decorator
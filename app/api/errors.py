@@ -1,6 +1,26 @@
 from flask import render_template, request, jsonify
 
 from . import api_blueprint
+from ..exceptions import ValidationError
+
+
+def bad_request(message):
+    response = jsonify({'error': 'bad request', 'message': message})
+    response.status_code = 400
+    return response
+
+
+def unauthorized(message):
+    response = jsonify({'error': 'unauthorized', 'message': message})
+    response.status_code = 401
+    return response
+
+
+def forbidden(message):
+    response = jsonify({'error': 'forbidden', 'message': message})
+    response.status_code = 403
+    return response
+
 
 @api_blueprint.errorhandler(404)
 def page_not_found(e):
@@ -9,3 +29,8 @@ def page_not_found(e):
         response.status_code = 404
         return response
     return render_template('404.html'), 404
+
+
+@api_blueprint.errorhandler(ValidationError)
+def validation_error(e):
+    return bad_request(e.args[0])
@@ -0,0 +1,46 @@
+from flask import request, jsonify, g, url_for
+
+from . import api_blueprint
+from .decorators import permission_required
+from .errors import forbidden
+from .serialization import list_response, project, requested_fields
+from .. import db
+from ..exceptions import ValidationError
+from ..models import Post, Permission
+
+
+@api_blueprint.route('/posts/')
+def get_posts():
+    return list_response('posts', Post, Post.query, (Post.timestamp, Post.id), 'api.get_posts')
+
+
+@api_blueprint.route('/posts/<int:id>')
+def get_post(id):
+    fields = requested_fields(Post)
+    post = project(Post.query, Post, fields).get_or_404(id)
+    return jsonify(post.to_json(fields))
+
+
+@api_blueprint.route('/posts/', methods=['POST'])
+@permission_required(Permission.WRITE)
+def new_post():
+    post = Post.from_json(request.get_json(silent=True))
+    post.author = g.current_user
+    db.session.add(post)
+    db.session.commit()
+    return jsonify(post.to_json()), 201, {'Location': url_for('api.get_post', id=post.id)}
+
+
+@api_blueprint.route('/posts/<int:id>', methods=['PUT'])
+@permission_required(Permission.WRITE)
+def edit_post(id):
+    post = Post.query.get_or_404(id)
+    if g.current_user != post.author and not g.current_user.can(Permission.ADMIN):
+        return forbidden('Insufficient permissions')
+    json_post = request.get_json(silent=True)
+    body = json_post.get('body') if isinstance(json_post, dict) else None
+    if not body:
+        raise ValidationError('post does not have a body')
+    post.body = body
+    db.session.commit()
+    return jsonify(post.to_json())
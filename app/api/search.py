@@ -0,0 +1,23 @@
+from flask import request
+
+from . import api_blueprint
+from .errors import bad_request
+from .serialization import requested_fields, stream_json
+from ..models import Post, Comment
+from ..search import search as search_documents
+
+
+@api_blueprint.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return bad_request('Missing search query')
+    kind = request.args.get('type', 'posts')
+    if kind not in ('posts', 'comments'):
+        return bad_request('Unknown result type')
+    model = Post if kind == 'posts' else Comment
+    fields = requested_fields(model)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    results = search_documents(model, query, page, per_page)
+    return stream_json(kind, results.items, fields, page=page, has_next=results.has_next)
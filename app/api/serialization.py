@@ -0,0 +1,84 @@
+import json
+
+from flask import current_app, request, stream_with_context, url_for
+
+from ..exceptions import ValidationError
+from ..pagination import keyset_paginate
+
+MAX_PER_PAGE = 100
+MAX_IDS = 100
+
+
+def requested_fields(model):
+    """The ``fields=`` projection of the request, or None for all fields."""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = [name for name in value.split(',') if name]
+    unknown = [name for name in fields if name not in model.json_fields]
+    if unknown:
+        raise ValidationError('unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def requested_ids():
+    """The ``ids=`` list of a multi-get, or None for a paginated listing."""
+    value = request.args.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = [int(id) for id in value.split(',') if id]
+    except ValueError:
+        raise ValidationError('ids must be a comma separated list of integers')
+    if len(ids) > MAX_IDS:
+        raise ValidationError('at most {} ids per request'.format(MAX_IDS))
+    return ids
+
+
+def project(query, model, fields, *always):
+    """Restrict ``query`` to the columns of ``fields`` and ``always``."""
+    if fields is None:
+        return query
+    return query.options(model.load_fields(fields, 'id', *always))
+
+
+def stream_json(key, items, fields, **meta):
+    """Respond with ``meta`` plus ``items`` as a list under ``key``.
+
+    The list is written one item at a time, so a large response never
+    exists as a single string in memory.
+    """
+    def generate():
+        head = json.dumps(meta)[:-1]
+        yield head + (', ' if meta else '') + json.dumps(key) + ': ['
+        for i, item in enumerate(items):
+            yield (', ' if i else '') + json.dumps(item.to_json(fields))
+        yield ']}'
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+
+def multi_get(key, model, query, ids):
+    """Serve the rows of ``ids`` in request order with one ``IN`` query."""
+    fields = requested_fields(model)
+    query = project(query, model, fields)
+    found = {item.id: item for item in query.filter(model.id.in_(ids))} if ids else {}
+    return stream_json(key, [found[id] for id in ids if id in found], fields,
+                       missing=[id for id in ids if id not in found])
+
+
+def list_response(key, model, query, columns, endpoint, key_func=None, **kwargs):
+    """Serve ``query`` as a multi-get when ``ids=`` is given, else one keyset page."""
+    ids = requested_ids()
+    if ids is not None:
+        return multi_get(key, model, query, ids)
+    fields = requested_fields(model)
+    query = project(query, model, fields, 'timestamp')
+    per_page = request.args.get('per_page', current_app.config.get('FLASKY_POSTS_PER_PAGE', 20), type=int)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    pagination = keyset_paginate(query, columns, request.args.get('cursor'), per_page, key=key_func)
+    args = dict(kwargs, per_page=per_page, _external=True)
+    if fields is not None:
+        args['fields'] = ','.join(fields)
+    return stream_json(key, pagination.items, fields,
+                       prev=url_for(endpoint, cursor=pagination.prev_cursor, **args) if pagination.has_prev else None,
+                       next=url_for(endpoint, cursor=pagination.next_cursor, **args) if pagination.has_next else None)
@@ -0,0 +1,43 @@
+from flask import jsonify, request
+
+from . import api_blueprint
+from .errors import bad_request
+from .serialization import list_response, multi_get, project, requested_fields, requested_ids
+from .. import db
+from ..graph import follow_graph
+from ..models import User, Post, Timeline
+
+
+@api_blueprint.route('/users/')
+def get_users():
+    ids = requested_ids()
+    if ids is None:
+        return bad_request('Users can only be listed by ids')
+    return multi_get('users', User, User.query, ids)
+
+
+@api_blueprint.route('/users/<int:id>')
+def get_user(id):
+    fields = requested_fields(User)
+    user = project(User.query, User, fields).get_or_404(id)
+    return jsonify(user.to_json(fields))
+
+
+@api_blueprint.route('/users/<int:id>/posts/')
+def get_user_posts(id):
+    user = User.query.options(db.load_only('id')).get_or_404(id)
+    return list_response('posts', Post, user.posts, (Post.timestamp, Post.id), 'api.get_user_posts', id=id)
+
+
+@api_blueprint.route('/users/<int:id>/timeline/')
+def get_user_followed_posts(id):
+    user = User.query.options(db.load_only('id')).get_or_404(id)
+    return list_response('posts', Post, user.followed_posts, (Timeline.timestamp, Timeline.post_id),
+                         'api.get_user_followed_posts', key_func=lambda p: (p.timestamp, p.id), id=id)
+
+
+@api_blueprint.route('/users/<int:id>/suggestions/')
+def get_user_suggestions(id):
+    user = User.query.options(db.load_only('id')).get_or_404(id)
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+    return multi_get('users', User, User.query, follow_graph.suggestions(user.id, limit))
@@ -6,13 +6,14 @@ from .forms import *
 from .. import db
 from ..email import send_email
 from ..decorators import admin_required
+from ..last_seen import last_seen_buffer
 
 
 
 @auth_blueprint.before_app_request
 def before_request():
     if current_user.is_authenticated:
-        current_user.ping()
+        last_seen_buffer.touch(current_user)
         if not current_user.confirmed \
                 and request.blueprint != 'auth' \
                 and request.endpoint != 'static':
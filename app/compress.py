@@ -0,0 +1,135 @@
+import gzip
+import mimetypes
+import os
+
+from flask import request, safe_join, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ['text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+                          'application/javascript', 'application/json', 'application/xml',
+                          'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon']
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class Compress:
+    """Negotiated gzip/brotli compression of responses.
+
+    Dynamic responses of an allowed type and at least
+    ``FLASKY_COMPRESS_MIN_SIZE`` bytes are compressed after the request.
+    Static files are served from the ``.br``/``.gz`` siblings written by
+    :func:`precompress_static` when those exist, so they cost no CPU per
+    request.  The ``brotli`` package is pinned in requirements.txt; where it
+    is missing anyway, only gzip is offered.
+    """
+
+    def __init__(self):
+        self.app = None
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('FLASKY_COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+        app.config.setdefault('FLASKY_COMPRESS_LEVEL', 6)
+        app.config.setdefault('FLASKY_COMPRESS_BROTLI_QUALITY', 4)
+        self.app = app
+        app.after_request(self.after_request)
+        if app.has_static_folder:
+            app.view_functions['static'] = self.send_static_file
+
+    def encodings(self):
+        return [name for name in ('br', 'gzip') if name != 'br' or brotli is not None]
+
+    def choose(self, available):
+        best, quality = None, 0
+        for name in available:
+            q = request.accept_encodings[name]
+            if q > quality:
+                best, quality = name, q
+        return best
+
+    def compress(self, data, encoding):
+        config = self.app.config
+        if encoding == 'br':
+            return brotli.compress(data, quality=config['FLASKY_COMPRESS_BROTLI_QUALITY'])
+        return gzip.compress(data, config['FLASKY_COMPRESS_LEVEL'])
+
+    def after_request(self, response):
+        config = self.app.config
+        if response.mimetype not in config['FLASKY_COMPRESS_MIMETYPES']:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.direct_passthrough or response.is_streamed or \
+                not 200 <= response.status_code < 300 or response.status_code == 204 or \
+                'Content-Encoding' in response.headers or response.cache_control.no_transform:
+            return response
+        if response.content_length is None or response.content_length < config['FLASKY_COMPRESS_MIN_SIZE']:
+            return response
+        encoding = self.choose(self.encodings())
+        if encoding is None:
+            return response
+        response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # a strong ETag names the exact bytes, which have changed
+            response.set_etag('{}-{}'.format(etag, encoding))
+        return response
+
+    def send_static_file(self, filename):
+        app = self.app
+        max_age = app.get_send_file_max_age(filename)
+        path = safe_join(app.static_folder, filename)
+        available = [name for name in self.encodings()
+                     if path is not None and is_fresh(path + SUFFIXES[name], path)]
+        encoding = self.choose(available) if available else None
+        if encoding is None:
+            response = send_from_directory(app.static_folder, filename, cache_timeout=max_age)
+        else:
+            response = send_from_directory(app.static_folder, filename + SUFFIXES[encoding],
+                                           cache_timeout=max_age, mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+        if available:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+compress = Compress()
+
+
+def is_fresh(compressed, original):
+    try:
+        return os.path.getmtime(compressed) >= os.path.getmtime(original)
+    except OSError:
+        return False
+
+
+def precompress_static(app):
+    """Write ``.gz`` (and ``.br``) siblings of the compressible static files.
+
+    Returns the number of files written; up-to-date ones are skipped.
+    """
+    config = app.config
+    written = 0
+    for root, dirs, files in os.walk(app.static_folder):
+        for name in files:
+            if name.endswith(tuple(SUFFIXES.values())):
+                continue
+            path = os.path.join(root, name)
+            if mimetypes.guess_type(name)[0] not in config['FLASKY_COMPRESS_MIMETYPES'] or \
+                    os.path.getsize(path) < config['FLASKY_COMPRESS_MIN_SIZE']:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            targets = [('.gz', lambda: gzip.compress(data, 9, mtime=0))]
+            if brotli is not None:
+                targets.append(('.br', lambda: brotli.compress(data, quality=11)))
+            for suffix, encode in targets:
+                if is_fresh(path + suffix, path):
+                    continue
+                with open(path + suffix, 'wb') as f:
+                    f.write(encode())
+                written += 1
+    return written
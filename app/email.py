@@ -1,20 +1,178 @@
-from threading import Thread
+import atexit
+import queue
+import smtplib
+import threading
+import time
 from flask import current_app, render_template
 from flask_mail import Message
 from . import mail
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+class MailDispatcher:
+    """Bounded pool of delivery threads fed from one message queue.
+
+    Each worker keeps its SMTP connection open between messages, sends up to
+    ``FLASKY_MAIL_BATCH_SIZE`` queued messages per wake-up and closes the
+    connection after ``FLASKY_MAIL_IDLE_TIMEOUT`` idle seconds.  Failed sends
+    reconnect and are retried with exponential backoff.  Workers start with
+    the first message, so each forked server worker gets its own pool.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self._exit_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_MAIL_WORKERS', 2)
+        app.config.setdefault('FLASKY_MAIL_QUEUE_SIZE', 1000)
+        app.config.setdefault('FLASKY_MAIL_BATCH_SIZE', 20)
+        app.config.setdefault('FLASKY_MAIL_MAX_RETRIES', 3)
+        app.config.setdefault('FLASKY_MAIL_RETRY_BACKOFF', 1.0)
+        app.config.setdefault('FLASKY_MAIL_IDLE_TIMEOUT', 30)
+        app.config.setdefault('FLASKY_MAIL_ENQUEUE_TIMEOUT', 1.0)
+        self.stop()
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['FLASKY_MAIL_QUEUE_SIZE'])
+        self.sent = self.failed = 0
+        self.total_latency = self.last_latency = 0.0
+        if not self._exit_registered:
+            atexit.register(self.stop)
+            self._exit_registered = True
+
+    def submit(self, msg):
+        """Queue ``msg`` for delivery; returns False if the queue stayed full."""
+        self._start()
+        try:
+            self.queue.put((msg, time.monotonic()), timeout=self.app.config['FLASKY_MAIL_ENQUEUE_TIMEOUT'])
+        except queue.Full:
+            self.app.logger.error('mail queue full, dropped message to %s', ', '.join(msg.recipients))
+            return False
+        return True
+
+    def _start(self):
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            while len(self.threads) < self.app.config['FLASKY_MAIL_WORKERS']:
+                thread = threading.Thread(target=self._work, name='mail-worker', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self, timeout=10):
+        """Deliver what is queued, then stop the workers."""
+        with self.lock:
+            threads, self.threads = self.threads, []
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self):
+        config = self.app.config
+        with self.app.app_context():
+            conn = None
+            while True:
+                try:
+                    item = self.queue.get(timeout=config['FLASKY_MAIL_IDLE_TIMEOUT'])
+                except queue.Empty:
+                    conn = self._close(conn)
+                    continue
+                batch = []
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= config['FLASKY_MAIL_BATCH_SIZE']:
+                        break
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                try:
+                    conn = self._deliver(conn, batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+                if item is None:
+                    self._close(conn)
+                    self.queue.task_done()
+                    return
+
+    def _deliver(self, conn, batch):
+        for msg, queued_at in batch:
+            try:
+                conn = self._send(conn, msg, queued_at)
+            except Exception:
+                # a message that cannot be sent at all must not stop the worker
+                self.app.logger.exception('failed to send mail to %s', ', '.join(msg.recipients or []))
+                self._record(None)
+                conn = self._close(conn)
+        return conn
+
+    def _send(self, conn, msg, queued_at):
+        config = self.app.config
+        for attempt in range(config['FLASKY_MAIL_MAX_RETRIES'] + 1):
+            try:
+                if conn is None:
+                    conn = self._open()
+                conn.send(msg)
+            except smtplib.SMTPRecipientsRefused:
+                self.app.logger.exception('recipients refused: %s', ', '.join(msg.recipients))
+                self._record(None)
+                break
+            except (smtplib.SMTPException, OSError):
+                conn = self._close(conn)
+                if attempt == config['FLASKY_MAIL_MAX_RETRIES']:
+                    self.app.logger.exception('failed to send mail to %s', ', '.join(msg.recipients))
+                    self._record(None)
+                else:
+                    time.sleep(config['FLASKY_MAIL_RETRY_BACKOFF'] * 2 ** attempt)
+            else:
+                self._record(time.monotonic() - queued_at)
+                break
+        return conn
+
+    def _open(self):
+        conn = mail.connect()
+        conn.__enter__()
+        return conn
+
+    def _close(self, conn):
+        if conn is not None and conn.host is not None:
+            try:
+                conn.host.quit()
+            except (smtplib.SMTPException, OSError):
+                conn.host.close()
+        return None
+
+    def _record(self, latency):
+        with self.lock:
+            if latency is None:
+                self.failed += 1
+            else:
+                self.sent += 1
+                self.total_latency += latency
+                self.last_latency = latency
+
+    def stats(self):
+        with self.lock:
+            return {'queued': self.queue.qsize() if self.queue else 0,
+                    'sent': self.sent,
+                    'failed': self.failed,
+                    'last_latency': self.last_latency,
+                    'avg_latency': self.total_latency / self.sent if self.sent else 0.0}
+
+
+mail_dispatcher = MailDispatcher()
 
 
 def send_email(to, subject, template, **kwargs):
     app = current_app._get_current_object()
-    # app = current_app
     msg = Message(subject, sender=app.config['FLASK_MAIL_SENDER'], recipients=[to])
     msg.body = render_template(template + '.txt', **kwargs)
     msg.html = render_template(template + '.html', **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+    return mail_dispatcher.submit(msg)
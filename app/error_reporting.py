@@ -0,0 +1,231 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, SMTPHandler
+
+from flask import has_request_context, request
+
+
+def fingerprint(record):
+    """Identify the place an error comes from, ignoring its details.
+
+    Exceptions are keyed on their type and the functions of their
+    traceback, other records on the logger and unformatted message, so
+    line edits and varying arguments do not split a group.
+    """
+    if record.exc_info and record.exc_info[0] is not None:
+        etype, _, tb = record.exc_info
+        frames = [(frame.filename, frame.name) for frame in traceback.extract_tb(tb)]
+        key = repr((etype.__module__, etype.__qualname__, frames))
+    else:
+        key = repr((record.name, record.levelno, str(record.msg)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+class ReportQueueHandler(QueueHandler):
+    """Hands records to the reporter thread without ever blocking."""
+
+    def __init__(self, reporter):
+        QueueHandler.__init__(self, reporter.queue)
+        self.reporter = reporter
+
+    def prepare(self, record):
+        record.fingerprint = fingerprint(record)
+        record.request_line = '{} {}'.format(request.method, request.url) if has_request_context() else None
+        return QueueHandler.prepare(self, record)
+
+    def enqueue(self, record):
+        self.reporter.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.reporter.count_dropped()
+
+
+class ReportListener(QueueListener):
+    def enqueue_sentinel(self):
+        # wait for room rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+class DigestMailer(SMTPHandler):
+    """``SMTPHandler`` that mails a prepared digest with its own subject."""
+
+    def getSubject(self, record):
+        return '{} ({})'.format(self.subject, record.summary)
+
+
+class Group:
+    def __init__(self, record):
+        self.record = record
+        self.count = 0
+        self.first_seen = self.last_seen = record.created
+
+
+class ErrorReporter(logging.Handler):
+    """Background, deduplicated error mail for ``app.logger``.
+
+    Logging an error only puts it on a bounded queue.  A listener thread
+    groups the records by :func:`fingerprint`, and every
+    ``FLASKY_ERROR_DIGEST_INTERVAL`` seconds a flush thread mails one
+    digest of the groups seen since the last one to ``FLASK_ADMIN``,
+    through ``SMTPHandler``.  A traceback is included at most once per
+    ``FLASKY_ERROR_REPEAT_INTERVAL`` seconds per group, later digests only
+    count it.  Records that find the queue full are counted and dropped.
+    Like the mail workers, the threads start with the first record, so
+    each forked server worker gets its own.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.app = None
+        self.queue = None
+        self.mailer = None
+        self.handler = None
+        self.listener = None
+        self.flusher = None
+        self.pid = None
+        self.groups = OrderedDict()
+        self.reported = {}
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self._exit_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_ERROR_QUEUE_SIZE', 1000)
+        app.config.setdefault('FLASKY_ERROR_DIGEST_INTERVAL', 60)
+        app.config.setdefault('FLASKY_ERROR_REPEAT_INTERVAL', 3600)
+        app.config.setdefault('FLASKY_ERROR_MAX_GROUPS', 20)
+        app.config.setdefault('FLASKY_ERROR_MAIL_SUBJECT', 'Application Error')
+        self.stop()
+        if self.handler is not None:
+            self.app.logger.removeHandler(self.handler)
+        self.app = app
+        config = app.config
+        self.queue = queue.Queue(maxsize=config['FLASKY_ERROR_QUEUE_SIZE'])
+        self.groups.clear()
+        self.reported.clear()
+        self.dropped = 0
+        credentials = secure = None
+        if config.get('MAIL_USERNAME') is not None:
+            credentials = (config['MAIL_USERNAME'], config.get('MAIL_PASSWORD'))
+            if config.get('MAIL_USE_TLS'):
+                secure = ()
+        self.mailer = DigestMailer(
+            mailhost=(config['MAIL_SERVER'], config['MAIL_PORT']),
+            fromaddr=config['FLASK_MAIL_SENDER'],
+            toaddrs=[config['FLASK_ADMIN']],
+            subject=config['FLASKY_ERROR_MAIL_SUBJECT'],
+            credentials=credentials,
+            secure=secure)
+        self.handler = ReportQueueHandler(self)
+        self.handler.setLevel(logging.ERROR)
+        app.logger.addHandler(self.handler)
+        if not self._exit_registered:
+            atexit.register(self.stop)
+            self._exit_registered = True
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stopping.clear()
+            self.listener = ReportListener(self.queue, self)
+            self.listener.start()
+            self.flusher = threading.Thread(target=self._flush_periodically, name='error-digest', daemon=True)
+            self.flusher.start()
+
+    def stop(self):
+        """Mail what has been reported, then stop the threads."""
+        if self.pid != os.getpid():
+            return
+        self.listener.stop()
+        self.stopping.set()
+        self.flusher.join()
+        self.pid = None
+        self.flush()
+
+    def count_dropped(self):
+        with self.lock:
+            self.dropped += 1
+
+    def emit(self, record):
+        with self.lock:
+            group = self.groups.get(record.fingerprint)
+            if group is None:
+                group = self.groups[record.fingerprint] = Group(record)
+            group.count += 1
+            group.last_seen = record.created
+
+    def _flush_periodically(self):
+        while not self.stopping.wait(self.app.config['FLASKY_ERROR_DIGEST_INTERVAL']):
+            try:
+                self.flush()
+            except Exception:
+                # not through app.logger, which would feed it back into the digest
+                logging.getLogger('flasky.errors').exception('could not mail the error digest')
+
+    def flush(self):
+        """Mail a digest of the groups collected since the last one, if any."""
+        with self.lock:
+            groups, self.groups = list(self.groups.items()), OrderedDict()
+            dropped, self.dropped = self.dropped, 0
+        if not groups and not dropped:
+            return
+        record = self.digest(groups, dropped)
+        self.mailer.handle(record)
+
+    def digest(self, groups, dropped):
+        config = self.app.config
+        now = time.time()
+        self.reported = {key: at for key, at in self.reported.items()
+                         if now - at < config['FLASKY_ERROR_REPEAT_INTERVAL']}
+        total = sum(group.count for _, group in groups) + dropped
+        lines = ['{} errors in {} groups since {}.'.format(
+            total, len(groups), format_time(min((group.first_seen for _, group in groups), default=now)))]
+        if dropped:
+            lines.append('{} more were dropped because the report queue was full.'.format(dropped))
+        shown = groups[:config['FLASKY_ERROR_MAX_GROUPS']]
+        for key, group in shown:
+            record = group.record
+            lines.append('')
+            lines.append('[{}] {} times, last at {}{}'.format(
+                key, group.count, format_time(group.last_seen),
+                ', e.g. ' + record.request_line if record.request_line else ''))
+            if key not in self.reported:
+                self.reported[key] = now
+                lines.append(record.getMessage())
+            else:
+                lines.append(summary_line(record) + ' (traceback mailed before)')
+        if len(groups) > len(shown):
+            lines.append('')
+            lines.append('... and {} more groups.'.format(len(groups) - len(shown)))
+        return logging.makeLogRecord({
+            'name': 'flasky.errors', 'levelno': logging.ERROR, 'levelname': 'ERROR',
+            'msg': '\n'.join(lines), 'summary': '{} errors, {} distinct'.format(total, len(groups))})
+
+
+def summary_line(record):
+    """First line of the message of ``record``, or its exception line."""
+    lines = record.getMessage().splitlines() or ['']
+    if lines[0].strip() or len(lines) == 1:
+        return lines[0]
+    # an empty message followed by its traceback
+    return lines[-1]
+
+
+def format_time(created):
+    return datetime.utcfromtimestamp(created).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+
+error_reporter = ErrorReporter()
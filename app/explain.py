@@ -0,0 +1,122 @@
+import json
+from datetime import datetime
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from . import db
+from .feeds import with_authors, posts_per_page
+from .models import User, Post, Comment, Follow, Timeline
+from .pagination import encode_cursor, keyset_query
+
+
+class Explain(Executable, ClauseElement):
+    """``statement`` prefixed with the EXPLAIN syntax of a backend."""
+
+    def __init__(self, statement, prefix):
+        self.statement = statement
+        self.prefix = prefix
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+    return element.prefix + compiler.process(element.statement, **kw)
+
+
+def audit_queries(user, post):
+    """Yield the name and query of what the feed and profile views run.
+
+    Keyset paginated lists are checked on their first page and on a
+    later one, whose range condition can change the plan.
+    """
+    later = encode_cursor('next', (datetime.utcnow(), 2 ** 31 - 1))
+    lists = [
+        ('index', with_authors(Post.query), (Post.timestamp, Post.id), posts_per_page()),
+        ('index, followed', with_authors(user.followed_posts), (Timeline.timestamp, Timeline.post_id),
+         posts_per_page()),
+        ('user', with_authors(user.posts), (Post.timestamp, Post.id), posts_per_page()),
+        ('post comments', with_authors(post.comments, Comment), (Comment.timestamp, Comment.id), 5),
+        ('followers', user.followers, (Follow.timestamp, Follow.follower_id), 5),
+        ('followed_by', user.followed, (Follow.timestamp, Follow.followed_id), 5),
+    ]
+    for name, query, columns, per_page in lists:
+        yield name, keyset_query(query, columns, None, per_page)[0]
+        yield name + ', later page', keyset_query(query, columns, later, per_page)[0]
+    yield 'user by name', User.query.filter_by(username=user.username)
+    yield 'post', with_authors(Post.query).filter(Post.id == post.id)
+
+
+def sqlite_issues(details, filtered=True):
+    """Full scans and sorts in SQLite's ``EXPLAIN QUERY PLAN`` output.
+
+    Walking a whole index is only accepted for a query without a WHERE
+    clause, where it reads rows in order until the LIMIT is reached.
+    """
+    issues = []
+    for detail in details:
+        if detail.startswith(('SCAN CONSTANT ROW', 'SCAN (subquery')):
+            continue
+        if detail.startswith('SCAN ') and (filtered or ' USING ' not in detail):
+            issues.append('full scan of ' + detail.split()[1])
+        elif detail.startswith('USE TEMP B-TREE'):
+            issues.append('filesort (' + detail[len('USE TEMP B-TREE FOR '):].lower() + ')')
+    return issues
+
+
+def mysql_issues(rows):
+    issues = []
+    for row in rows:
+        if row['type'] == 'ALL':
+            issues.append('full scan of ' + row['table'])
+        extra = row['Extra'] or ''
+        if 'Using filesort' in extra or 'Using temporary' in extra:
+            issues.append('filesort on ' + row['table'])
+    return issues
+
+
+def postgresql_issues(plan):
+    issues = []
+    if plan['Node Type'] == 'Seq Scan':
+        issues.append('full scan of ' + plan['Relation Name'])
+    elif plan['Node Type'] in ('Sort', 'Incremental Sort'):
+        issues.append('filesort (' + ', '.join(plan.get('Sort Key', [])) + ')')
+    for child in plan.get('Plans', []):
+        issues.extend(postgresql_issues(child))
+    return issues
+
+
+def plan_issues(conn, query):
+    """EXPLAIN ``query`` on ``conn`` and list its full scans and filesorts."""
+    dialect = conn.dialect.name
+    statement = query.statement
+    if dialect == 'sqlite':
+        rows = conn.execute(Explain(statement, 'EXPLAIN QUERY PLAN '))
+        return sqlite_issues((row[-1] for row in rows), query.whereclause is not None)
+    if dialect == 'mysql':
+        return mysql_issues([dict(row) for row in conn.execute(Explain(statement, 'EXPLAIN '))])
+    if dialect == 'postgresql':
+        plan = conn.execute(Explain(statement, 'EXPLAIN (FORMAT JSON) ')).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return postgresql_issues(plan[0]['Plan'])
+    raise NotImplementedError('EXPLAIN is not supported on ' + dialect)
+
+
+def audit(user, post):
+    """Yield ``(name, issues)`` for each query of :func:`audit_queries`.
+
+    On PostgreSQL sequential scans and sorts are switched off for the
+    audit, so one shows up only when no index can avoid it and the verdict
+    does not depend on how much data the database holds.  MySQL and SQLite
+    plans should be judged on realistic data, e.g. from ``flask fake``.
+    """
+    with db.engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            if conn.dialect.name == 'postgresql':
+                conn.execute('SET LOCAL enable_seqscan = off')
+                conn.execute('SET LOCAL enable_sort = off')
+            for name, query in audit_queries(user, post):
+                yield name, plan_issues(conn, query)
+        finally:
+            transaction.rollback()
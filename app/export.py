@@ -0,0 +1,73 @@
+import json
+import zlib
+
+from . import db
+from .models import User, Post, Comment, Follow, isoformat
+
+
+def _pages(select, key, chunk_size):
+    """Iterate ``select`` in ``key`` order, one ``chunk_size`` query at a time.
+
+    Each page is a separate ``WHERE key > :last ORDER BY key LIMIT`` query,
+    so memory stays bounded on drivers that buffer whole results (such as
+    mysql-connector, which has no server-side cursors), and a connection is
+    only checked out for the duration of one page rather than for the
+    whole, possibly slow, download.
+    """
+    select = select.where(key > db.bindparam('last')).order_by(key).limit(chunk_size)
+    last = 0
+    while True:
+        with db.engine.connect() as conn:
+            rows = conn.execute(select, {'last': last}).fetchall()
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            break
+        last = rows[-1][key.name]
+
+
+def export_records(user, chunk_size=1000):
+    """Yield the account of ``user`` as dicts, one per row.
+
+    The profile comes first, followed by the user's posts, comments, the
+    accounts they follow and their followers, each in id order.
+    """
+    users, posts, comments, follow = User.__table__, Post.__table__, Comment.__table__, Follow.__table__
+    yield {'type': 'user', 'id': user.id, 'username': user.username, 'email': user.email,
+           'name': user.name, 'location': user.location, 'about_me': user.about_me,
+           'member_since': isoformat(user.member_since), 'last_seen': isoformat(user.last_seen)}
+    select = db.select([posts.c.id, posts.c.body, posts.c.timestamp, posts.c.modified]).\
+        where(posts.c.author_id == user.id)
+    for row in _pages(select, posts.c.id, chunk_size):
+        yield {'type': 'post', 'id': row.id, 'body': row.body,
+               'timestamp': isoformat(row.timestamp), 'modified': isoformat(row.modified)}
+
+    select = db.select([comments.c.id, comments.c.post_id, comments.c.body, comments.c.timestamp]).\
+        where(comments.c.author_id == user.id)
+    for row in _pages(select, comments.c.id, chunk_size):
+        yield {'type': 'comment', 'id': row.id, 'post_id': row.post_id, 'body': row.body,
+               'timestamp': isoformat(row.timestamp)}
+
+    for kind, mine, theirs in (('following', follow.c.follower_id, follow.c.followed_id),
+                               ('follower', follow.c.followed_id, follow.c.follower_id)):
+        select = db.select([users.c.id, users.c.username, follow.c.timestamp]).\
+            select_from(follow.join(users, users.c.id == theirs)).\
+            where(db.and_(mine == user.id, theirs != user.id))
+        for row in _pages(select, users.c.id, chunk_size):
+            yield {'type': kind, 'user_id': row.id, 'username': row.username,
+                   'timestamp': isoformat(row.timestamp)}
+
+
+def ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def gzipped(lines, level=6):
+    """Gzip a stream of text lines, yielding compressed chunks as they fill."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for line in lines:
+        chunk = compressor.compress(line.encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
@@ -1,8 +1,16 @@
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from random import randint
 from sqlalchemy.exc import IntegrityError
 from faker import Faker
+from werkzeug import security
 from . import db
-from .models import User, Post
+from .models import User, Post, Comment, Follow, Role, Timeline
+from .render import render_rows
+from .search import reindex
 
 
 def users(count=100):
@@ -27,11 +35,183 @@ def users(count=100):
 
 def posts(count=100):
     fake = Faker('zh_CN')
-    user_count = User.query.count()
+    ids = [id for id, in db.session.query(User.id)]
     for i in range(count):
-        u = User.query.offset(randint(0, user_count - 1)).first()
         p = Post(body=fake.text().encode('utf-8'),
                  timestamp=fake.past_date(),
-                 author=u)
+                 author_id=ids[randint(0, len(ids) - 1)])
         db.session.add(p)
     db.session.commit()
+
+
+class BulkGenerator:
+    """Seeded generator of production-sized data sets.
+
+    Rows are written with Core ``executemany`` inserts of ``batch_size``
+    rows and explicit ids, bypassing the ORM and its hooks; the timelines,
+    counters and search index are rebuilt once at the end instead.  Who
+    gets followed, who posts and which posts get comments all follow
+    power laws, and posts arrive in bursts.  The same seed on an empty
+    database produces the same data.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, workers=None, days=365, vocabulary=5000):
+        self.random = random.Random(seed)
+        self.fake = Faker('zh_CN')
+        self.fake.seed_instance(seed)
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.end = datetime(2020, 1, 1)
+        self.start = self.end - timedelta(days=days)
+        self.words = [self.fake.word() for _ in range(vocabulary)]
+        self.user_ids = []
+        self.member_since = {}
+
+    def zipf_weights(self, n, exponent=1.1):
+        """Cumulative weights giving rank ``k`` a share proportional to ``k ** -exponent``."""
+        return list(itertools.accumulate(1.0 / (k ** exponent) for k in range(1, n + 1)))
+
+    def skewed(self, ids, exponent=1.1):
+        """A shuffled copy of ``ids`` and its cumulative power-law weights."""
+        ids = list(ids)
+        self.random.shuffle(ids)
+        return ids, self.zipf_weights(len(ids), exponent)
+
+    def moment(self, after=None):
+        start = max(after or self.start, self.start)
+        return start + (self.end - start) * self.random.random()
+
+    def text(self, low, high):
+        words = self.random.choices(self.words, k=self.random.randint(low, high))
+        if len(words) > 4 and self.random.random() < 0.3:
+            i = self.random.randrange(len(words))
+            words[i] = '**{}**'.format(words[i])
+        return ' '.join(words)
+
+    @staticmethod
+    def next_id(model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def insert(self, model, rows):
+        for i in range(0, len(rows), self.batch_size):
+            db.session.execute(model.__table__.insert(), rows[i:i + self.batch_size])
+            db.session.commit()
+
+    def render(self, pool, rows, tags):
+        """Fill in ``body_html`` of ``rows`` using every worker process."""
+        size = max(1, len(rows) // self.workers + 1)
+        chunks = [[(i, row['body']) for i, row in enumerate(rows[n:n + size], n)]
+                  for n in range(0, len(rows), size)]
+        for rendered in pool.map(render_rows, chunks, itertools.repeat(tags)):
+            for i, html in rendered:
+                rows[i]['body_html'] = html
+
+    def users(self, count):
+        role_id = Role.query.filter_by(default=True).first().id
+        password_hash = security.generate_password_hash('password')
+        first = self.next_id(User)
+        rows = []
+        for id in range(first, first + count):
+            member_since = self.moment()
+            rows.append({'id': id, 'email': 'user{}@example.com'.format(id),
+                         'username': '{}{}'.format(self.fake.user_name(), id),
+                         'role_id': role_id, 'password_hash': password_hash, 'confirmed': True,
+                         'name': self.fake.name(), 'location': self.fake.city(),
+                         'about_me': self.text(5, 20), 'member_since': member_since,
+                         'last_seen': self.moment(member_since)})
+            self.member_since[id] = member_since
+        self.insert(User, rows)
+        self.user_ids.extend(range(first, first + count))
+        return len(rows)
+
+    def follows(self, average):
+        popular, weights = self.skewed(self.user_ids)
+        total = 0
+        rows = []
+        for follower_id in self.user_ids:
+            count = min(int(self.random.expovariate(1.0 / average)) if average else 0, len(popular) - 1)
+            followed = set(self.random.choices(popular, cum_weights=weights, k=count))
+            followed.discard(follower_id)
+            for followed_id in sorted(followed):
+                since = max(self.member_since[follower_id], self.member_since[followed_id])
+                rows.append({'follower_id': follower_id, 'followed_id': followed_id,
+                             'timestamp': self.moment(since)})
+            if len(rows) >= self.batch_size:
+                self.insert(Follow, rows)
+                total += len(rows)
+                rows = []
+        self.insert(Follow, rows)
+        return total + len(rows)
+
+    def posts(self, count, pool):
+        authors, weights = self.skewed(self.user_ids)
+        bursts = sorted(self.moment() for _ in range(max(1, count // 50)))
+        first = self.next_id(Post)
+        post_times = []
+        for start in range(first, first + count, self.batch_size):
+            rows = []
+            for id in range(start, min(start + self.batch_size, first + count)):
+                author_id = self.random.choices(authors, cum_weights=weights)[0]
+                burst = self.random.choice(bursts)
+                timestamp = min(max(burst + timedelta(seconds=self.random.expovariate(1 / 900.0)),
+                                    self.member_since[author_id]), self.end)
+                rows.append({'id': id, 'body': self.text(10, 80), 'timestamp': timestamp,
+                             'modified': timestamp, 'author_id': author_id})
+                post_times.append(timestamp)
+            self.render(pool, rows, Post.allowed_tags)
+            self.insert(Post, rows)
+        return first, post_times
+
+    def comments(self, count, pool, first_post, post_times):
+        if not post_times:
+            return 0
+        posts, weights = self.skewed(range(len(post_times)), exponent=0.9)
+        first = self.next_id(Comment)
+        for start in range(first, first + count, self.batch_size):
+            rows = []
+            for id in range(start, min(start + self.batch_size, first + count)):
+                index = self.random.choices(posts, cum_weights=weights)[0]
+                timestamp = min(post_times[index] + timedelta(seconds=self.random.expovariate(1 / 3600.0)),
+                                self.end)
+                rows.append({'id': id, 'body': self.text(3, 30), 'timestamp': timestamp,
+                             'disabled': False, 'post_id': first_post + index,
+                             'author_id': self.random.choice(self.user_ids)})
+            self.render(pool, rows, Comment.allowed_tags)
+            self.insert(Comment, rows)
+        return count
+
+    def run(self, users=1000, posts=10000, comments=20000, follows=20, progress=None):
+        """Generate everything and rebuild the derived tables; returns row counts."""
+        progress = progress or (lambda message: None)
+        counts = {}
+        with ProcessPoolExecutor(self.workers) as pool:
+            counts['users'] = self.users(users)
+            progress('{users} users'.format(**counts))
+            counts['follows'] = self.follows(follows)
+            progress('{follows} follows'.format(**counts))
+            first_post, post_times = self.posts(posts, pool)
+            counts['posts'] = len(post_times)
+            progress('{posts} posts'.format(**counts))
+            counts['comments'] = self.comments(comments, pool, first_post, post_times)
+            progress('{comments} comments'.format(**counts))
+        sync_sequences(User, Post, Comment)
+        Post.reconcile_counters()
+        User.reconcile_counters()
+        db.session.commit()
+        Timeline.rebuild()
+        for model in (Post, Comment):
+            for _ in reindex(model, self.batch_size):
+                pass
+        progress('rebuilt timelines, counters and search index')
+        return counts
+
+
+def sync_sequences(*models):
+    """Move Postgres id sequences past ids that were inserted explicitly."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                           "(SELECT coalesce(max(id), 1) FROM {0}))".format(table))
+    db.session.commit()
@@ -0,0 +1,39 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from .models import User, Post, Comment, Timeline
+from .pagination import keyset_paginate
+
+
+def with_authors(query, entity=Post):
+    """Load the author and their role in the same query as ``entity``."""
+    return query.options(joinedload(entity.author).joinedload(User.role))
+
+
+def posts_per_page():
+    return current_app.config.get('FLASKY_POSTS_PER_PAGE', 5)
+
+
+def home_feed(user, followed=False, cursor=None):
+    if followed:
+        return keyset_paginate(with_authors(user.followed_posts), (Timeline.timestamp, Timeline.post_id),
+                               cursor, posts_per_page(), key=lambda p: (p.timestamp, p.id))
+    return keyset_paginate(with_authors(Post.query), (Post.timestamp, Post.id), cursor, posts_per_page())
+
+
+def user_posts(user, cursor=None):
+    return keyset_paginate(with_authors(user.posts), (Post.timestamp, Post.id), cursor, posts_per_page())
+
+
+def get_post_or_404(id):
+    return with_authors(Post.query).get_or_404(id)
+
+
+def post_comments(post, cursor=None, per_page=5):
+    return keyset_paginate(with_authors(post.comments, Comment), (Comment.timestamp, Comment.id),
+                           cursor, per_page)
+
+
+def users_in_order(ids):
+    users = {user.id: user for user in User.query.filter(User.id.in_(ids))} if ids else {}
+    return [users[id] for id in ids if id in users]
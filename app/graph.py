@@ -0,0 +1,230 @@
+import os
+import pickle
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from . import db
+
+# Hops through very popular accounts only look at this many of their
+# edges, spread evenly over the list, which bounds the cost of one
+# suggestion query.
+MAX_FANOUT = 1000
+
+# More changes than this since the last build trigger a rebuild from the
+# database, so the list replayed on top of a new build stays bounded.
+MAX_PENDING_CHANGES = 100000
+
+# Seconds before a failed load is tried again.
+RETRY_INTERVAL = 60
+
+
+class FollowGraph:
+    """Who-follows-whom, held in compressed sparse row arrays.
+
+    ``sources`` lists the follower ids in ascending order; the accounts
+    followed by ``sources[i]`` are ``targets[offsets[i]:offsets[i + 1]]``.
+    Follows and unfollows committed by this process are kept as deltas on
+    top of the arrays until the next rebuild.
+
+    ``flask rebuild-follow-graph`` writes a snapshot to
+    ``FLASKY_FOLLOW_GRAPH_PATH``, which every worker reloads when it
+    changes, so the command should run periodically (from cron, say).
+    Without a snapshot each worker builds the arrays from the database and
+    rebuilds them every ``FLASKY_FOLLOW_GRAPH_MAX_AGE`` seconds.  Loading
+    and building happen in one background thread at a time; requests keep
+    using the previous arrays meanwhile, and get no suggestions before the
+    first load has finished.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.lock = threading.Lock()
+        self.arrays = None
+        self.built_at = 0.0
+        self.snapshot_mtime = None
+        self.changes = []
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.loader = None
+        self.generation = 0
+        self.retry_at = 0.0
+        self._events_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_FOLLOW_GRAPH_PATH', None)
+        app.config.setdefault('FLASKY_FOLLOW_GRAPH_MAX_AGE', 3600)
+        with self.lock:
+            # a load still running for the previous app is discarded
+            self.generation += 1
+            self.app = app
+            self.arrays = None
+            self.built_at = 0.0
+            self.snapshot_mtime = None
+            self.changes = []
+            self.added.clear()
+            self.removed.clear()
+            self.retry_at = 0.0
+        if not self._events_registered:
+            db.event.listen(db.session, 'after_commit', self.on_commit)
+            db.event.listen(db.session, 'after_rollback', self.on_rollback)
+            self._events_registered = True
+
+    @staticmethod
+    def build():
+        """Read the follow table into ``(sources, offsets, targets)`` arrays."""
+        from .models import Follow
+        follow = Follow.__table__
+        sources, offsets, targets = array('q'), array('q'), array('q')
+        rows = db.session.execute(
+            db.select([follow.c.follower_id, follow.c.followed_id]).
+            where(follow.c.follower_id != follow.c.followed_id).
+            order_by(follow.c.follower_id, follow.c.followed_id).
+            execution_options(stream_results=True))
+        for follower_id, followed_id in rows:
+            if not sources or sources[-1] != follower_id:
+                sources.append(follower_id)
+                offsets.append(len(targets))
+            targets.append(followed_id)
+        offsets.append(len(targets))
+        return sources, offsets, targets
+
+    @staticmethod
+    def save(path, arrays, built_at):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((built_at, arrays), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def refresh(self, rebuild=False):
+        """Start loading a newer snapshot, or rebuilding when stale, in the background.
+
+        With ``rebuild`` the arrays are rebuilt from the database even
+        when a snapshot is configured.
+        """
+        config = self.app.config
+        path = None if rebuild else config['FLASKY_FOLLOW_GRAPH_PATH']
+        mtime = None
+        if path:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                pass
+        if time.time() < self.retry_at:
+            return
+        if mtime is not None:
+            if mtime == self.snapshot_mtime and self.arrays is not None:
+                return
+        elif not rebuild and self.arrays is not None and \
+                time.time() - self.built_at <= config['FLASKY_FOLLOW_GRAPH_MAX_AGE']:
+            return
+        with self.lock:
+            if self.loader is not None and self.loader.is_alive():
+                return
+            self.loader = threading.Thread(target=self._load, args=(self.app, self.generation, path, mtime),
+                                           name='follow-graph', daemon=True)
+            self.loader.start()
+
+    def wait(self, timeout=None):
+        """Wait for a load started by :meth:`refresh` to finish."""
+        loader = self.loader
+        if loader is not None:
+            loader.join(timeout)
+
+    def _load(self, app, generation, path, mtime):
+        try:
+            if mtime is not None:
+                with open(path, 'rb') as f:
+                    built_at, arrays = pickle.load(f)
+            else:
+                built_at = time.time()
+                with app.app_context():
+                    arrays = self.build()
+        except Exception:
+            app.logger.exception('could not load the follow graph')
+            self.retry_at = time.time() + RETRY_INTERVAL
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            if mtime is not None:
+                self.snapshot_mtime = mtime
+            if self.arrays is not None and built_at < self.built_at:
+                # an older snapshot than the arrays already in use
+                return
+            self.arrays, self.built_at = arrays, built_at
+            self.changes = [change for change in self.changes if change[0] > built_at]
+            self.added.clear()
+            self.removed.clear()
+            for _, follower_id, followed_id, following in self.changes:
+                self._apply(follower_id, followed_id, following)
+
+    def _apply(self, follower_id, followed_id, following):
+        if following:
+            self.removed[follower_id].discard(followed_id)
+            self.added[follower_id].add(followed_id)
+        else:
+            self.added[follower_id].discard(followed_id)
+            self.removed[follower_id].add(followed_id)
+
+    def stage(self, session, follower_id, followed_id, following):
+        """Remember a follow change flushed by ``session`` until it commits."""
+        if follower_id != followed_id:
+            session.info.setdefault('follow_graph', []).append((follower_id, followed_id, following))
+
+    def on_commit(self, session):
+        staged = session.info.pop('follow_graph', None)
+        if not staged:
+            return
+        now = time.time()
+        with self.lock:
+            for follower_id, followed_id, following in staged:
+                self.changes.append((now, follower_id, followed_id, following))
+                self._apply(follower_id, followed_id, following)
+            overflowing = len(self.changes) > MAX_PENDING_CHANGES
+        if overflowing and self.app is not None:
+            self.refresh(rebuild=True)
+
+    def on_rollback(self, session):
+        session.info.pop('follow_graph', None)
+
+    def following(self, user_id, limit=None, arrays=None):
+        """The ids ``user_id`` follows, with this process's recent changes applied.
+
+        With ``limit`` at most about that many of the ids in the arrays are
+        used, taken at even steps through the list.
+        """
+        sources, offsets, targets = arrays or self.arrays
+        i = bisect_left(sources, user_id)
+        if i < len(sources) and sources[i] == user_id:
+            start, end = offsets[i], offsets[i + 1]
+            step = -(-(end - start) // limit) if limit else 1
+            result = set(targets[start:end:step])
+        else:
+            result = set()
+        with self.lock:
+            if user_id in self.removed:
+                result -= self.removed[user_id]
+            if user_id in self.added:
+                result |= self.added[user_id]
+        return result
+
+    def suggestions(self, user_id, limit=5):
+        """Accounts followed by the most of the accounts ``user_id`` follows."""
+        self.refresh()
+        arrays = self.arrays
+        if arrays is None:
+            return []
+        direct = self.following(user_id, arrays=arrays)
+        counts = Counter()
+        for followed_id in direct:
+            counts.update(self.following(followed_id, MAX_FANOUT, arrays))
+        for id in direct | {user_id}:
+            counts.pop(id, None)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [id for id, _ in ranked[:limit]]
+
+
+follow_graph = FollowGraph()
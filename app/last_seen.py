@@ -0,0 +1,83 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+
+
+class LastSeenBuffer:
+    """Write-behind buffer for ``User.last_seen``.
+
+    Requests only record the time in memory.  A user is recorded at most once
+    per ``FLASKY_LAST_SEEN_GRANULARITY`` seconds, and the recorded times are
+    written with one bulk UPDATE every ``FLASKY_LAST_SEEN_FLUSH_INTERVAL``
+    seconds and once more when the worker exits.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.recorded = {}
+        self.last_flush = time.monotonic()
+        self._exit_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_LAST_SEEN_GRANULARITY', 60)
+        app.config.setdefault('FLASKY_LAST_SEEN_FLUSH_INTERVAL', 10)
+        self.app = app
+        if not self._exit_registered:
+            atexit.register(self.flush_at_exit)
+            self._exit_registered = True
+
+    def touch(self, user):
+        config = self.app.config
+        now = datetime.utcnow()
+        granularity = timedelta(seconds=config['FLASKY_LAST_SEEN_GRANULARITY'])
+        with self.lock:
+            previous = self.recorded.get(user.id)
+            if previous is not None and now - previous < granularity:
+                return
+            self.recorded[user.id] = now
+            self.pending[user.id] = now
+            due = time.monotonic() - self.last_flush >= config['FLASKY_LAST_SEEN_FLUSH_INTERVAL']
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write all pending times, returning the number of users updated."""
+        granularity = timedelta(seconds=self.app.config['FLASKY_LAST_SEEN_GRANULARITY'])
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+            horizon = datetime.utcnow() - granularity
+            self.recorded = {k: v for k, v in self.recorded.items() if v > horizon}
+        if not pending:
+            return 0
+
+        from .models import User
+        users = User.__table__
+        stmt = users.update().where(users.c.id == db.bindparam('user_id')).\
+            values(last_seen=db.bindparam('seen'))
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt, [{'user_id': k, 'seen': v} for k, v in pending.items()])
+        except SQLAlchemyError:
+            self.app.logger.exception('failed to flush last_seen for %d users', len(pending))
+            with self.lock:
+                for k, v in pending.items():
+                    self.pending.setdefault(k, v)
+            return 0
+        return len(pending)
+
+    def flush_at_exit(self):
+        if self.app is None or not self.pending:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+last_seen_buffer = LastSeenBuffer()
@@ -4,9 +4,13 @@ main_blueprint = Blueprint('main', __name__)
 
 
 from . import views, errors
+from .fragments import post_fragment
 from ..models import Permission
 
 
 @main_blueprint.app_context_processor
 def inject_permission():
     return dict(Permission=Permission)
+
+
+main_blueprint.add_app_template_global(post_fragment)
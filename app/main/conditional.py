@@ -0,0 +1,54 @@
+import hashlib
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+
+def viewer_key():
+    """What a page shows about the viewer: the navbar and permission links."""
+    if current_user.is_anonymous:
+        return None
+    return current_user.id, current_user.username, current_user.email, current_user.role.permissions
+
+
+def make_etag(parts):
+    raw = repr((current_app.config.get('FLASKY_ETAG_SALT', ''), request.path,
+                request.args.get('cursor'), viewer_key(), tuple(parts)))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return last_modified is not None and since is not None and \
+        last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(parts, last_modified, render):
+    """Answer a GET with 304 when the client's copy is current, else ``render()``.
+
+    ``parts`` must cover everything the page shows apart from the viewer,
+    which is added here.  ``last_modified`` may only be given when every
+    change to the page moves it; clients that send just
+    ``If-Modified-Since``, crawlers in particular, are answered from it alone.  A page with pending flash messages is rendered and
+    sent without validators, so it is never revalidated later.
+    """
+    if session.get('_flashes'):
+        return make_response(render())
+    etag = make_etag(parts)
+    if is_fresh(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def latest(*times):
+    times = [t for t in times if t is not None]
+    return max(times) if times else None
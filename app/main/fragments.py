@@ -0,0 +1,25 @@
+from flask import render_template
+from markupsafe import Markup
+
+from ..cache import LRUCache
+
+CONTROLS_MARKER = '<!-- post-controls -->'
+
+fragment_cache = LRUCache(maxsize=2048)
+
+
+def post_fragment(post):
+    """Return the cached ``(head, tail)`` HTML of one ``_post.html`` entry.
+
+    The entry is rendered once per ``(post.id, post.version)``; model events
+    bump ``Post.version`` whenever the body, comment count or author's name
+    or email change.  Viewer-specific controls go between head and tail.
+    """
+    key = (post.id, post.version)
+    parts = fragment_cache.get(key)
+    if parts is None:
+        html = render_template('_post_entry.html', post=post)
+        head, _, tail = html.partition(CONTROLS_MARKER)
+        parts = (Markup(head), Markup(tail))
+        fragment_cache.set(key, parts)
+    return parts
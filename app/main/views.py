@@ -1,11 +1,18 @@
 from datetime import datetime
-from flask import render_template, redirect, url_for, make_response, request, abort, flash
+from flask import render_template, redirect, url_for, make_response, request, abort, flash, \
+    stream_with_context, current_app
 from flask_login import current_user, login_required
 
 from . import main_blueprint
 from .forms import *
 from ..models import *
 from ..decorators import permission_required
+from ..pagination import keyset_paginate
+from .. import feeds
+from ..search import search as search_documents
+from ..graph import follow_graph
+from ..export import export_records, ndjson, gzipped
+from .conditional import conditional_response, latest
 
 
 @main_blueprint.route('/', methods=['GET', 'POST'])
@@ -19,40 +26,100 @@ def index():
     show_followed = False
     if current_user.is_authenticated:
         show_followed = bool(request.cookies.get('show_followed', ''))
-    if show_followed:
-        qury = current_user.followed_posts
-    else:
-        qury = Post.query
-
-    page = request.args.get('page', 1, type=int)
-    pagination = qury.order_by(Post.timestamp.desc()).paginate(
-        page, error_out=False, per_page=current_app.config.get('FLASKY_POSTS_PER_PAGE', 5))
+    pagination = feeds.home_feed(current_user, show_followed, request.args.get('cursor'))
     posts = pagination.items
-    return render_template('index.html', time=datetime.utcnow(), form=form,
-                           posts=posts, pagination=pagination, show_followed=show_followed)
+
+    def render():
+        return render_template('index.html', time=datetime.utcnow(), form=form,
+                               posts=posts, pagination=pagination, show_followed=show_followed)
+
+    if current_user.is_authenticated or request.method != 'GET':
+        return render()
+    return conditional_response([(post.id, post.version) for post in posts],
+                                latest(*[post.modified for post in posts]), render)
 
 
 @main_blueprint.route('/user/<username>')
 def user(username):
     user = User.query.filter_by(username=username).first_or_404()
-    posts = user.posts.order_by(Post.timestamp.desc()).all()
-    return render_template('user.html', user=user, posts=posts)
+    pagination = feeds.user_posts(user, request.args.get('cursor'))
+    posts = pagination.items
+    parts = [user.username, user.email, user.name, user.location, user.about_me, user.role_id,
+             user.confirmed, user.last_seen, user.followers_count, user.followed_count,
+             [(post.id, post.version) for post in posts]]
+    follow_state = None
+    suggestions = []
+    if current_user.is_authenticated:
+        follow_state = current_user.follow_states([user.id])[user.id]
+        if user == current_user and current_user.can(Permission.FOLLOW):
+            suggestions = feeds.users_in_order(follow_graph.suggestions(user.id))
+    parts += [follow_state, [(u.id, u.username, u.email) for u in suggestions]]
+    # no Last-Modified: profile edits, counters, follow state and suggestions
+    # are all on the page, but no timestamp moves when they change
+    return conditional_response(parts, None,
+                                lambda: render_template('user.html', user=user, posts=posts, pagination=pagination,
+                                                        follow_state=follow_state, suggestions=suggestions))
+
+
+@main_blueprint.route('/user/<username>/posts')
+def user_posts(username):
+    """The next chunk of a profile's posts, for infinite scrolling."""
+    user = User.query.filter_by(username=username).first_or_404()
+    pagination = feeds.user_posts(user, request.args.get('cursor'))
+    response = make_response(render_template('_post.html', posts=pagination.items))
+    if pagination.has_next:
+        response.headers['X-Next-Page'] = url_for('.user_posts', username=username,
+                                                  cursor=pagination.next_cursor)
+    return response
+
+
+@main_blueprint.route('/user/<username>/export')
+@login_required
+def export_user(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    if current_user != user and not current_user.can(Permission.ADMIN):
+        abort(403)
+    lines = ndjson(export_records(user))
+    if request.args.get('gzip'):
+        body, mimetype, filename = gzipped(lines), 'application/gzip', username + '.ndjson.gz'
+    else:
+        body, mimetype, filename = lines, 'application/x-ndjson', username + '.ndjson'
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
 
 
 @main_blueprint.route('/post/<int:id>', methods=['GET', 'POST'])
 def post(id):
-    post = Post.query.get_or_404(id)
+    post = feeds.get_post_or_404(id)
     form = CommentForm()
     if form.validate_on_submit():
         comment = Comment(body=form.body.data, post=post, author=current_user)
         db.session.add(comment)
         db.session.commit()
         flash('comment success')
-    page = request.args.get('page', 1, int)
-    pagination = post.comments.order_by(Comment.timestamp.desc()).paginate(page, per_page=5, error_out=False)
+    pagination = feeds.post_comments(post, request.args.get('cursor'))
     comments = pagination.items
 
-    return render_template('post.html', posts=[post], pagination=pagination, comments=comments, form=form)
+    def render():
+        return render_template('post.html', posts=[post], pagination=pagination, comments=comments, form=form)
+
+    # The comment form carries a per-session CSRF token, so only pages
+    # without it can be revalidated.
+    if request.method != 'GET' or current_user.can(Permission.COMMENT):
+        return render()
+    parts = [post.version, [(c.id, c.author.username, c.author.email) for c in comments]]
+    return conditional_response(parts, latest(post.modified, *[c.timestamp for c in comments]), render)
+
+
+@main_blueprint.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    kind = 'comments' if request.args.get('type') == 'comments' else 'posts'
+    page = max(request.args.get('page', 1, type=int), 1)
+    results = search_documents(Comment if kind == 'comments' else Post, query, page,
+                               feeds.posts_per_page())
+    return render_template('search.html', query=query, kind=kind, results=results)
 
 
 @main_blueprint.route('/edit_post/<int:id>', methods=['GET', 'POST'])
@@ -114,12 +181,13 @@ def followers(username):
     if not user:
         flash('user invalid')
         redirect(url_for('main.index'))
-    page = request.args.get('page', 1, int)
-    pagination = user.followers.paginate(page, per_page=5, error_out=False)
+    pagination = keyset_paginate(user.followers, (Follow.timestamp, Follow.follower_id),
+                                 request.args.get('cursor'), per_page=5)
     follows = [{'user': item.follower, 'timestamp': item.timestamp}
                for item in pagination.items]
+    states = current_user.follow_states([follow['user'].id for follow in follows])
     return render_template('followers.html', pagination=pagination, user=user, endpoint='main.followers',
-                           follows=follows, titel='Followers of')
+                           follows=follows, states=states, titel='Followers of')
 
 
 @main_blueprint.route('/followed_by/<username>')
@@ -130,12 +198,13 @@ def followed_by(username):
     if not user:
         flash('user invalid')
         redirect(url_for('main.index'))
-    page = request.args.get('page', 1, int)
-    pagination = user.followed.paginate(page, per_page=5, error_out=False)
+    pagination = keyset_paginate(user.followed, (Follow.timestamp, Follow.followed_id),
+                                 request.args.get('cursor'), per_page=5)
     follows = [{'user': item.followed, 'timestamp': item.timestamp}
                for item in pagination.items]
+    states = current_user.follow_states([follow['user'].id for follow in follows])
     return render_template('followers.html', pagination=pagination, user=user, endpoint='main.followed_by',
-                           follows=follows, titel='Followed by')
+                           follows=follows, states=states, titel='Followed by')
 
 
 @main_blueprint.route('/all')
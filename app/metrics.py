@@ -0,0 +1,140 @@
+import ipaddress
+import os
+import time
+
+from flask import abort, g, request
+from sqlalchemy import event
+
+from .email import mail_dispatcher
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+# gunicorn.conf.py points this at a directory shared by the workers before
+# any of them imports prometheus_client.
+MULTIPROCESS_ENV = 'prometheus_multiproc_dir'
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+WAIT_BUCKETS = (.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30)
+RENDER_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .5)
+
+
+class NullMetric:
+    """Stands in for every metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if prometheus_client is not None:
+    requests_total = prometheus_client.Counter(
+        'flasky_http_requests_total', 'HTTP requests served.', ['method', 'endpoint', 'status'])
+    request_seconds = prometheus_client.Histogram(
+        'flasky_http_request_duration_seconds', 'Time to build a response, by endpoint.',
+        ['method', 'endpoint'], buckets=LATENCY_BUCKETS)
+    pool_wait_seconds = prometheus_client.Histogram(
+        'flasky_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled database connection.',
+        buckets=WAIT_BUCKETS)
+    mail_queue_depth = prometheus_client.Gauge(
+        'flasky_mail_queue_depth', 'Messages waiting for a mail worker.', multiprocess_mode='livesum')
+    render_seconds = prometheus_client.Histogram(
+        'flasky_markdown_render_seconds', 'Time to render and sanitize one Markdown body.',
+        buckets=RENDER_BUCKETS)
+else:  # pragma: no cover
+    requests_total = request_seconds = pool_wait_seconds = mail_queue_depth = render_seconds = NullMetric()
+
+
+def time_pool(pool):
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_wait_seconds.observe(time.perf_counter() - start)
+    pool.connect = timed_connect
+
+
+def time_checkouts(engine):
+    """Observe how long each connection checkout of ``engine`` takes.
+
+    The engine's pool gets a timed ``connect``, and so does the pool that
+    replaces it after a dispose.
+    """
+    time_pool(engine.pool)
+    event.listen(engine, 'engine_disposed', lambda engine: time_pool(engine.pool))
+    return engine
+
+
+class Metrics:
+    """Prometheus metrics, served at ``/metrics``.
+
+    Request counts and latency are labelled with the endpoint name, so the
+    number of series stays bounded.  Under gunicorn every worker writes its
+    samples to the ``prometheus_multiproc_dir`` directory and a scrape of
+    any one worker reports the sum over all of them.  ``/metrics`` answers
+    only clients in the ``FLASKY_METRICS_ALLOW`` networks, loopback by
+    default; everyone else gets a 404.  Without prometheus_client
+    installed nothing is recorded and there is no ``/metrics`` endpoint.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.allowed = []
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_METRICS', True)
+        app.config.setdefault('FLASKY_METRICS_ALLOW', ['127.0.0.1/32', '::1/128'])
+        self.app = app
+        self.allowed = [ipaddress.ip_network(network) for network in app.config['FLASKY_METRICS_ALLOW']]
+        if prometheus_client is None or not app.config['FLASKY_METRICS']:
+            return
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def is_allowed(self, address):
+        try:
+            address = ipaddress.ip_address(address or '')
+        except ValueError:
+            return False
+        return any(address in network for network in self.allowed)
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.endpoint or 'none'
+            request_seconds.labels(request.method, endpoint).observe(time.perf_counter() - start)
+            requests_total.labels(request.method, endpoint, str(response.status_code)).inc()
+        mail_queue_depth.set(mail_dispatcher.stats()['queued'])
+        return response
+
+    def export(self):
+        if not self.is_allowed(request.remote_addr):
+            abort(404)
+        if os.environ.get(MULTIPROCESS_ENV):
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.generate_latest(registry), 200, \
+            {'Content-Type': prometheus_client.CONTENT_TYPE_LATEST}
+
+
+metrics = Metrics()
@@ -1,12 +1,17 @@
 import hashlib
+from collections import namedtuple
 from datetime import datetime
-import bleach
-from markdown import markdown
 from werkzeug import security
 from flask_login import UserMixin, AnonymousUserMixin
-from flask import current_app
+from flask import current_app, g, has_app_context, url_for
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from sqlalchemy.dialects import mysql
 from . import db, login_manager
+from .exceptions import ValidationError
+from .cache import LRUCache
+from .graph import follow_graph
+from .render import renderer
+from .search import index_document, remove_document
 
 
 class Permission:
@@ -17,6 +22,32 @@ class Permission:
     ADMIN = 16
 
 
+def isoformat(value):
+    return value.isoformat() + 'Z' if value is not None else None
+
+
+class JsonMixin:
+    """``to_json`` driven by the model's ``json_fields``.
+
+    ``json_fields`` maps each field name to the columns it reads and a
+    function of the instance returning its value, so a query serving only
+    some fields can load just their columns.
+    """
+    json_fields = {}
+
+    def to_json(self, fields=None):
+        return {name: dump(self) for name, (columns, dump) in self.json_fields.items()
+                if fields is None or name in fields}
+
+    @classmethod
+    def load_fields(cls, fields, *always):
+        """Query option loading the columns of ``fields`` plus ``always``."""
+        columns = set(always)
+        for name in fields:
+            columns.update(cls.json_fields[name][0])
+        return db.load_only(*columns)
+
+
 class Role(db.Model):
     __tablename__ = 'roles'
     id = db.Column(db.Integer, primary_key=True)
@@ -65,13 +96,37 @@ class Role(db.Model):
         return self.permissions & perm == perm
 
 
+FollowState = namedtuple('FollowState', 'following followed_by')
+
+
 class Follow(db.Model):
+    __table_args__ = (
+        db.Index('ix_follow_follower_timestamp', 'follower_id', 'timestamp', 'followed_id'),
+        db.Index('ix_follow_followed_timestamp', 'followed_id', 'timestamp', 'follower_id'),
+    )
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     timestamp = db.Column(db.DateTime(), default=datetime.utcnow)
 
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Follow.update_counts(connection, target, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Follow.update_counts(connection, target, -1)
+
+    @staticmethod
+    def update_counts(connection, target, delta):
+        users = User.__table__
+        connection.execute(users.update().where(users.c.id == target.follower_id).
+                           values(followed_count=users.c.followed_count + delta))
+        connection.execute(users.update().where(users.c.id == target.followed_id).
+                           values(followers_count=users.c.followers_count + delta))
+        follow_graph.stage(db.inspect(target).session, target.follower_id, target.followed_id, delta > 0)
+
 
-class User(UserMixin, db.Model):
+class User(UserMixin, JsonMixin, db.Model):
     __tablename__ = 'users'
     __table_args__ = {
         'mysql_charset': 'utf8'
@@ -88,6 +143,8 @@ class User(UserMixin, db.Model):
     about_me = db.Column(db.Text())
     member_since = db.Column(db.DateTime(), default=datetime.utcnow)
     last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
+    followers_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    followed_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     followed = db.relationship('Follow',
                                foreign_keys=[Follow.follower_id],
@@ -101,6 +158,20 @@ class User(UserMixin, db.Model):
                                 cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='author', lazy='dynamic')
 
+    json_fields = {
+        'url': (('id',), lambda u: url_for('api.get_user', id=u.id)),
+        'username': (('username',), lambda u: u.username),
+        'name': (('name',), lambda u: u.name),
+        'location': (('location',), lambda u: u.location),
+        'about_me': (('about_me',), lambda u: u.about_me),
+        'member_since': (('member_since',), lambda u: isoformat(u.member_since)),
+        'last_seen': (('last_seen',), lambda u: isoformat(u.last_seen)),
+        'followers_count': (('followers_count',), lambda u: u.followers_count),
+        'followed_count': (('followed_count',), lambda u: u.followed_count),
+        'posts_url': (('id',), lambda u: url_for('api.get_user_posts', id=u.id)),
+        'followed_posts_url': (('id',), lambda u: url_for('api.get_user_followed_posts', id=u.id)),
+    }
+
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if self.role is None:
@@ -119,8 +190,9 @@ class User(UserMixin, db.Model):
 
     @property
     def followed_posts(self):
-        return db.session.query(Post).select_from(Follow).filter_by(follower_id=self.id).\
-            join(Post, Follow.followed_id == Post.author_id).union(Post.query.filter_by(author_id=self.id))
+        return Post.query.join(Timeline, Timeline.post_id == Post.id).\
+            filter(Timeline.user_id == self.id).\
+            order_by(Timeline.timestamp.desc(), Timeline.post_id.desc())
 
     @staticmethod
     def confirm_token(token, confirm_list=None, token_data=None):
@@ -187,11 +259,43 @@ class User(UserMixin, db.Model):
         if not self.is_following(user):
             f = Follow(follower=self, followed=user)
             db.session.add(f)
+            Timeline.backfill(self, user)
+            self.forget_follow_states(user)
 
     def unfollow(self, user):
         f = self.followed.filter_by(followed_id=user.id).first()
         if f:
             db.session.delete(f)
+            Timeline.prune(self, user)
+            self.forget_follow_states(user)
+
+    def follow_states(self, user_ids):
+        """Map each of ``user_ids`` to a ``FollowState`` relative to this user.
+
+        All ids are looked up with one query, and the results are kept in
+        ``g`` so later lookups in the same request cost nothing.
+        """
+        cache = g.setdefault('follow_states', {}).setdefault(self.id, {}) if has_app_context() else {}
+        missing = set(user_ids) - set(cache)
+        if missing:
+            follow = Follow.__table__
+            rows = db.session.execute(db.select([follow.c.follower_id, follow.c.followed_id]).where(db.or_(
+                db.and_(follow.c.follower_id == self.id, follow.c.followed_id.in_(missing)),
+                db.and_(follow.c.followed_id == self.id, follow.c.follower_id.in_(missing)))))
+            following, followed_by = set(), set()
+            for follower_id, followed_id in rows:
+                if follower_id == self.id:
+                    following.add(followed_id)
+                if followed_id == self.id:
+                    followed_by.add(follower_id)
+            for id in missing:
+                cache[id] = FollowState(id in following, id in followed_by)
+        return {id: cache[id] for id in user_ids}
+
+    def forget_follow_states(self, user):
+        if has_app_context() and 'follow_states' in g:
+            g.follow_states.pop(self.id, None)
+            g.follow_states.pop(user.id, None)
 
     def is_following(self, user):
         if not user:
@@ -203,27 +307,100 @@ class User(UserMixin, db.Model):
             return False
         return self.followers.filter_by(follower_id=user.id).first() is not None
 
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        # username and gravatar appear in every rendered post of the author
+        state = db.inspect(target)
+        if state.attrs.username.history.has_changes() or state.attrs.email.history.has_changes():
+            posts = Post.__table__
+            connection.execute(posts.update().where(posts.c.author_id == target.id).
+                               values(**Post.bumped_version()))
 
-class Post(db.Model):
+    @staticmethod
+    def reconcile_counters():
+        users = User.__table__
+        follow = Follow.__table__
+        followers = db.select([db.func.count()]).where(follow.c.followed_id == users.c.id).as_scalar()
+        followed = db.select([db.func.count()]).where(follow.c.follower_id == users.c.id).as_scalar()
+        result = db.session.execute(users.update().
+                                    where(db.or_(users.c.followers_count.is_distinct_from(followers),
+                                                 users.c.followed_count.is_distinct_from(followed))).
+                                    values(followers_count=followers, followed_count=followed))
+        return result.rowcount
+
+
+class Post(JsonMixin, db.Model):
+    __table_args__ = (
+        db.Index('ix_post_author_timestamp', 'author_id', 'timestamp', 'id'),
+        db.Index('ix_post_timestamp', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text())
     body_html = db.Column(db.Text())
     timestamp = db.Column(db.DateTime(), default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    version = db.Column(db.Integer, default=0, server_default='0')
+    modified = db.Column(db.DateTime(), default=datetime.utcnow)
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
 
+    allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
+                    'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
+                    'h1', 'h2', 'h3', 'p']
+    search_doc_type = 1
+
+    json_fields = {
+        'url': (('id',), lambda p: url_for('api.get_post', id=p.id)),
+        'body': (('body',), lambda p: p.body),
+        'body_html': (('body_html',), lambda p: p.body_html),
+        'timestamp': (('timestamp',), lambda p: isoformat(p.timestamp)),
+        'author_url': (('author_id',), lambda p: url_for('api.get_user', id=p.author_id) if p.author_id else None),
+        'comments_url': (('id',), lambda p: url_for('api.get_post_comments', id=p.id)),
+        'comment_count': (('comment_count',), lambda p: p.comment_count),
+    }
+
+    @staticmethod
+    def from_json(json_post):
+        body = json_post.get('body') if isinstance(json_post, dict) else None
+        if not body:
+            raise ValidationError('post does not have a body')
+        return Post(body=body)
+
     @staticmethod
     def on_body_changed(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
-                        'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-                        'h1', 'h2', 'h3', 'p']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
+        if value == oldvalue:
+            return
+        target.body_html = renderer.render(value, Post.allowed_tags)
+        target.search_pending = True
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if db.inspect(target).attrs.body_html.history.has_changes():
+            # incremented in the UPDATE, so a concurrent bump is not lost
+            target.version = db.func.coalesce(Post.version, 0) + 1
+            target.modified = datetime.utcnow()
 
+    @staticmethod
+    def bumped_version():
+        """UPDATE values marking posts as changed, for Core statements."""
+        posts = Post.__table__
+        return {'version': db.func.coalesce(posts.c.version, 0) + 1, 'modified': datetime.utcnow()}
 
-class Comment(db.Model):
+    @staticmethod
+    def reconcile_counters():
+        posts = Post.__table__
+        comments = Comment.__table__
+        actual = db.select([db.func.count()]).where(comments.c.post_id == posts.c.id).as_scalar()
+        result = db.session.execute(posts.update().where(posts.c.comment_count.is_distinct_from(actual)).
+                                    values(comment_count=actual))
+        return result.rowcount
+
+
+class Comment(JsonMixin, db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_post_timestamp', 'post_id', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
@@ -232,15 +409,180 @@ class Comment(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'))
 
+    allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong']
+    search_doc_type = 2
+
+    json_fields = {
+        'url': (('id',), lambda c: url_for('api.get_comment', id=c.id)),
+        'post_url': (('post_id',), lambda c: url_for('api.get_post', id=c.post_id) if c.post_id else None),
+        'body': (('body',), lambda c: c.body),
+        'body_html': (('body_html',), lambda c: c.body_html),
+        'timestamp': (('timestamp',), lambda c: isoformat(c.timestamp)),
+        'author_url': (('author_id',), lambda c: url_for('api.get_user', id=c.author_id) if c.author_id else None),
+    }
+
+    @staticmethod
+    def from_json(json_comment):
+        body = json_comment.get('body') if isinstance(json_comment, dict) else None
+        if not body:
+            raise ValidationError('comment does not have a body')
+        return Comment(body=body)
+
     @staticmethod
     def on_body_changed(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong']
-        target.body_html = bleach.linkify(bleach.clean(markdown(value, output_format='html'),
-                                                       tags=allowed_tags, strip=True))
+        if value == oldvalue:
+            return
+        target.body_html = renderer.render(value, Comment.allowed_tags)
+        target.search_pending = True
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Comment.update_counts(connection, target, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Comment.update_counts(connection, target, -1)
+
+    @staticmethod
+    def update_counts(connection, target, delta):
+        posts = Post.__table__
+        connection.execute(posts.update().where(posts.c.id == target.post_id).
+                           values(comment_count=posts.c.comment_count + delta,
+                                  **Post.bumped_version()))
+
+
+class RenderedHtml(db.Model):
+    """Persistent store behind the Markdown render cache, keyed by digest."""
+    __tablename__ = 'rendered_html'
+    digest = db.Column(db.String(40), primary_key=True)
+    html = db.Column(db.Text())
+
+
+TERM_TYPE = db.String(64).with_variant(mysql.VARCHAR(64, collation='utf8mb4_bin'), 'mysql')
+
+
+class SearchTerm(db.Model):
+    """Inverted index over post and comment bodies, one row per (term, document).
+
+    A document's rows are rewritten in the flush that saves a new body, and
+    ``search.reindex`` rebuilds them in bulk.
+    """
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        db.Index('ix_search_terms_document', 'doc_type', 'doc_id'),
+        db.Index('ix_search_terms_rank', 'term', 'doc_type', 'tf', 'doc_id'),
+    )
+    # compared byte for byte, so terms an accent-insensitive collation
+    # would consider equal cannot collide in the primary key
+    term = db.Column(TERM_TYPE, primary_key=True)
+    doc_type = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    doc_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tf = db.Column(db.Integer)
+
+    @staticmethod
+    def on_document_saved(mapper, connection, target):
+        if target.__dict__.pop('search_pending', False):
+            index_document(connection, target.search_doc_type, target.id, target.body)
+
+    @staticmethod
+    def on_document_deleted(mapper, connection, target):
+        remove_document(connection, target.search_doc_type, target.id)
+
+
+class SearchFrequency(db.Model):
+    """Number of documents of each type containing a term, kept with the postings."""
+    __tablename__ = 'search_frequencies'
+    term = db.Column(TERM_TYPE, primary_key=True)
+    doc_type = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    df = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+
+class Timeline(db.Model):
+    """Materialized home timeline, one row per (reader, post).
+
+    Rows are written when a post is created (fan-out to the author and all
+    followers) and when a follow is added or removed, so reading the
+    followed feed is a range scan on (user_id, timestamp).
+    """
+    __tablename__ = 'timeline'
+    __table_args__ = (
+        db.Index('ix_timeline_user_timestamp', 'user_id', 'timestamp', 'post_id'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime())
+
+    @staticmethod
+    def on_post_inserted(mapper, connection, target):
+        timeline = Timeline.__table__
+        post = Post.__table__
+        follow = Follow.__table__
+        connection.execute(timeline.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'],
+            db.select([post.c.author_id, post.c.id, post.c.timestamp]).
+            where(db.and_(post.c.id == target.id, post.c.author_id.isnot(None)))))
+        connection.execute(timeline.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'],
+            db.select([follow.c.follower_id, post.c.id, post.c.timestamp]).
+            select_from(follow.join(post, follow.c.followed_id == post.c.author_id)).
+            where(db.and_(post.c.id == target.id, follow.c.follower_id != post.c.author_id))))
+
+    @staticmethod
+    def backfill(follower, followed):
+        if follower.id == followed.id:
+            return
+        post = Post.__table__
+        db.session.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'],
+            db.select([db.literal(follower.id), post.c.id, post.c.timestamp]).
+            where(post.c.author_id == followed.id)))
+
+    @staticmethod
+    def prune(follower, followed):
+        if follower.id == followed.id:
+            return
+        timeline = Timeline.__table__
+        post = Post.__table__
+        db.session.execute(timeline.delete().where(db.and_(
+            timeline.c.user_id == follower.id,
+            timeline.c.post_id.in_(db.select([post.c.id]).where(post.c.author_id == followed.id)))))
+
+    @staticmethod
+    def rebuild(user=None):
+        timeline = Timeline.__table__
+        post = Post.__table__
+        follow = Follow.__table__
+        own = db.select([post.c.author_id, post.c.id, post.c.timestamp]).\
+            where(post.c.author_id.isnot(None))
+        followed = db.select([follow.c.follower_id, post.c.id, post.c.timestamp]).\
+            select_from(follow.join(post, follow.c.followed_id == post.c.author_id)).\
+            where(follow.c.follower_id != post.c.author_id)
+        delete = timeline.delete()
+        if user is not None:
+            own = own.where(post.c.author_id == user.id)
+            followed = followed.where(follow.c.follower_id == user.id)
+            delete = delete.where(timeline.c.user_id == user.id)
+        db.session.execute(delete)
+        db.session.execute(timeline.insert().from_select(['user_id', 'post_id', 'timestamp'], own))
+        db.session.execute(timeline.insert().from_select(['user_id', 'post_id', 'timestamp'], followed))
+        db.session.commit()
 
 
 db.event.listen(Post.body, 'set', Post.on_body_changed)
 db.event.listen(Comment.body, 'set', Comment.on_body_changed)
+db.event.listen(Post, 'after_insert', Timeline.on_post_inserted)
+db.event.listen(Comment, 'after_insert', Comment.on_inserted)
+db.event.listen(Comment, 'after_delete', Comment.on_deleted)
+db.event.listen(Follow, 'after_insert', Follow.on_inserted)
+db.event.listen(Follow, 'after_delete', Follow.on_deleted)
+db.event.listen(Post, 'before_update', Post.on_updated)
+db.event.listen(User, 'after_update', User.on_updated)
+db.event.listen(Post, 'after_insert', SearchTerm.on_document_saved)
+db.event.listen(Post, 'after_update', SearchTerm.on_document_saved)
+db.event.listen(Post, 'after_delete', SearchTerm.on_document_deleted)
+db.event.listen(Comment, 'after_insert', SearchTerm.on_document_saved)
+db.event.listen(Comment, 'after_update', SearchTerm.on_document_saved)
+db.event.listen(Comment, 'after_delete', SearchTerm.on_document_deleted)
 
 
 class AnonymousUser(AnonymousUserMixin):
@@ -251,9 +593,43 @@ class AnonymousUser(AnonymousUserMixin):
         return False
 
 
+user_cache = LRUCache(maxsize=1024)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Load the request's user from the per-worker snapshot cache.
+
+    Snapshots are detached users with their role already loaded; columns that
+    change without an ORM flush (last_seen and the counters) are deferred so
+    they are read fresh if a page needs them.
+    """
+    user_id = int(user_id)
+    ttl = current_app.config.get('FLASKY_USER_CACHE_TTL', 0)
+    snapshot = user_cache.get(user_id) if ttl else None
+    if snapshot is None:
+        snapshot = User.query.options(db.joinedload(User.role),
+                                      db.defer(User.last_seen),
+                                      db.defer(User.followers_count),
+                                      db.defer(User.followed_count)).get(user_id)
+        if snapshot is None or not ttl:
+            return snapshot
+        db.session.expunge(snapshot)
+        user_cache.set(user_id, snapshot, ttl)
+    return db.session.merge(snapshot, load=False)
+
+
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.delete(target.id)
+
+
+def invalidate_cached_users(mapper, connection, target):
+    user_cache.clear()
+
+
+db.event.listen(User, 'after_update', invalidate_cached_user)
+db.event.listen(User, 'after_delete', invalidate_cached_user)
+db.event.listen(Role, 'after_update', invalidate_cached_users)
 
 
 login_manager.anonymous_user = AnonymousUser
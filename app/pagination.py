@@ -0,0 +1,99 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+# Ids must fit a signed 64-bit column; bools and larger numbers are rejected.
+MAX_IDENT = 2 ** 63
+
+
+def encode_cursor(direction, key):
+    timestamp, ident = key
+    raw = json.dumps([direction, timestamp.strftime(TIMESTAMP_FORMAT), ident])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(direction, (timestamp, id))`` or raise ``ValueError``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, timestamp, ident = json.loads(raw.decode('utf-8'))
+        if direction not in ('next', 'prev') or type(ident) is not int or not 0 <= ident < MAX_IDENT:
+            raise ValueError('invalid cursor')
+        timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('invalid cursor')
+    return direction, (timestamp, ident)
+
+
+class KeysetPagination:
+    """One page of a keyset paginated query.
+
+    Unlike Flask-SQLAlchemy's ``Pagination`` there is no page number or
+    total, only opaque cursors pointing at the neighbouring pages.
+    """
+    is_keyset = True
+
+    def __init__(self, items, per_page, next_key=None, prev_key=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = next_key is not None
+        self.has_prev = prev_key is not None
+        self.next_cursor = encode_cursor('next', next_key) if self.has_next else None
+        self.prev_cursor = encode_cursor('prev', prev_key) if self.has_prev else None
+
+
+def keyset_query(query, columns, cursor=None, per_page=20):
+    """Order and filter ``query`` for the page at ``cursor``.
+
+    Returns the query, limited to one row more than ``per_page``, along
+    with the decoded direction and position of the cursor.
+    """
+    ts_col, id_col = columns
+    direction, position = 'next', None
+    if cursor:
+        try:
+            direction, position = decode_cursor(cursor)
+        except ValueError:
+            pass
+
+    query = query.order_by(None)
+    if position is None:
+        query = query.order_by(ts_col.desc(), id_col.desc())
+    elif direction == 'next':
+        ts, ident = position
+        query = query.filter(ts_col <= ts, (ts_col < ts) | (id_col < ident)).\
+            order_by(ts_col.desc(), id_col.desc())
+    else:
+        ts, ident = position
+        query = query.filter(ts_col >= ts, (ts_col > ts) | (id_col > ident)).\
+            order_by(ts_col.asc(), id_col.asc())
+    return query.limit(per_page + 1), direction, position
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, key=None):
+    """Paginate ``query`` newest first on the ``(timestamp, id)`` ``columns``.
+
+    Each page is a single index range scan whatever its depth.  ``key``
+    maps a result row to its ``(timestamp, id)`` pair and defaults to
+    reading the attributes named after ``columns``.
+    """
+    ts_col, id_col = columns
+    if key is None:
+        def key(item):
+            return getattr(item, ts_col.key), getattr(item, id_col.key)
+
+    query, direction, position = keyset_query(query, columns, cursor, per_page)
+    items = query.all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if direction == 'prev' and position is not None:
+        items.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, position is not None
+
+    next_key = key(items[-1]) if has_next and items else None
+    prev_key = key(items[0]) if has_prev and items else None
+    return KeysetPagination(items, per_page, next_key, prev_key)
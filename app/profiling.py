@@ -0,0 +1,112 @@
+import json
+import logging
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy.engine import Engine
+
+from . import db
+
+logger = logging.getLogger('flasky.profiling')
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = []
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.timings.append((elapsed, statement))
+        self.statements[statement] += 1
+
+    def slowest(self, count):
+        return sorted(self.timings, key=lambda timing: timing[0], reverse=True)[:count]
+
+    def repeated(self, threshold):
+        """Statements run at least ``threshold`` times, the usual sign of N+1 loading."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+class QueryProfiler:
+    """Per-request SQL statistics, enabled with ``FLASKY_SQL_PROFILING``.
+
+    Every statement run while a request is active is timed through the
+    engine's cursor events.  Responses get ``X-Query-Count`` and
+    ``Server-Timing`` headers, and requests slower than
+    ``FLASKY_SLOW_REQUEST_THRESHOLD`` seconds or repeating one statement
+    ``FLASKY_N_PLUS_ONE_THRESHOLD`` times are logged as JSON to the
+    ``flasky.profiling`` logger.
+    """
+
+    def __init__(self):
+        self._events_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_SQL_PROFILING', False)
+        app.config.setdefault('FLASKY_SLOW_REQUEST_THRESHOLD', 0.5)
+        app.config.setdefault('FLASKY_N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('FLASKY_PROFILING_SLOWEST', 5)
+        if not app.config['FLASKY_SQL_PROFILING']:
+            return
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        if not self._events_registered:
+            db.event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+            db.event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+            self._events_registered = True
+
+    @staticmethod
+    def current():
+        if has_request_context():
+            return g.get('sql_profile')
+        return None
+
+    def start(self):
+        g.sql_profile = RequestProfile()
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current() is not None:
+            conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self.current()
+        started = conn.info.get('profiling_started')
+        if profile is not None and started:
+            profile.record(statement, time.perf_counter() - started.pop())
+
+    def finish(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        config = current_app.config
+        elapsed = time.perf_counter() - profile.started
+        slow = elapsed >= config['FLASKY_SLOW_REQUEST_THRESHOLD']
+        response.headers['X-Query-Count'] = str(profile.queries)
+        response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(
+            profile.db_time * 1000, profile.queries))
+        response.headers.add('Server-Timing', 'app;dur={:.1f}'.format(elapsed * 1000))
+        repeated = profile.repeated(config['FLASKY_N_PLUS_ONE_THRESHOLD'])
+        if slow or repeated:
+            logger.warning(json.dumps({
+                'event': 'slow_request' if slow else 'n_plus_one',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'db_ms': round(profile.db_time * 1000, 1),
+                'queries': profile.queries,
+                'slowest': [{'ms': round(t * 1000, 2), 'statement': s}
+                            for t, s in profile.slowest(config['FLASKY_PROFILING_SLOWEST'])],
+                'repeated': [{'count': n, 'statement': s} for s, n in repeated],
+            }))
+        return response
+
+
+query_profiler = QueryProfiler()
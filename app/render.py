@@ -0,0 +1,215 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import bleach
+import markdown
+from bleach.linkifier import Linker
+from bleach.sanitizer import Cleaner
+from flask import current_app
+from markdown import Markdown
+
+from . import db
+from .cache import LRUCache
+from .metrics import render_seconds
+
+# Bump when render_html changes its output, so stored results keyed on the
+# old pipeline are no longer found.
+RENDERER_VERSION = 1
+
+_version = '{}/{}/{}'.format(RENDERER_VERSION, markdown.__version__, bleach.__version__)
+
+_local = threading.local()
+
+
+def _tools(tags):
+    """Return this thread's Markdown converter, sanitizer and linkifier.
+
+    None of them is thread safe, but all of them can be reused, so each
+    thread builds one set per tag policy instead of one per call.
+    """
+    tools = getattr(_local, 'tools', None)
+    if tools is None:
+        tools = _local.tools = {}
+    key = tuple(tags)
+    if key not in tools:
+        tools[key] = (Markdown(output_format='html'), Cleaner(tags=list(tags), strip=True), Linker())
+    return tools[key]
+
+
+def render_html(source, tags):
+    """Render Markdown ``source`` to sanitized, linkified HTML."""
+    md, cleaner, linker = _tools(tags)
+    md.reset()
+    return linker.linkify(cleaner.clean(md.convert(source)))
+
+
+def render_rows(rows, tags):
+    """Render ``(id, body)`` pairs; runs in the re-render worker processes."""
+    return [(id, render_html(body, tags) if body is not None else None) for id, body in rows]
+
+
+def rerender(model, chunk_size=1000, workers=None, start_after=0):
+    """Regenerate ``body_html`` for every row of ``model`` after ``start_after``.
+
+    Rows are read in primary key order, one chunk per query, and rendered in
+    a process pool.  Chunks are written back with a bulk UPDATE and
+    committed in order, and after each one ``(last_id, rows)`` is yielded, so
+    an interrupted run can resume from the last id it reported.  The stored
+    ``rendered_html`` entries for the re-rendered sources are replaced as
+    well, so :class:`MarkdownRenderer` does not bring the old HTML back.
+    """
+    from .models import RenderedHtml
+    table = model.__table__
+    stored = RenderedHtml.__table__
+    select = db.select([table.c.id, table.c.body]).where(table.c.id > db.bindparam('last')).\
+        order_by(table.c.id).limit(chunk_size)
+    values = {'body_html': db.bindparam('html')}
+    if hasattr(model, 'bumped_version'):
+        values.update(model.bumped_version())
+    update = table.update().where(table.c.id == db.bindparam('row_id')).values(**values)
+    tags = list(model.allowed_tags)
+    min_length = current_app.config.get('FLASKY_RENDER_STORE_MIN_LENGTH', 256)
+    workers = workers or os.cpu_count() or 1
+
+    def write(rows, future):
+        results = future.result()
+        db.session.execute(update, [{'row_id': id, 'html': html} for id, html in results])
+        entries = {digest(body, tags): html for (_, body), (_, html) in zip(rows, results)
+                   if body is not None and len(body) >= min_length}
+        if entries:
+            db.session.execute(stored.delete().where(stored.c.digest.in_(list(entries))))
+            db.session.execute(_insert_ignore(stored), [{'digest': key, 'html': html} for key, html in entries.items()])
+        db.session.commit()
+        return results[-1][0], len(results)
+
+    with ProcessPoolExecutor(workers) as pool:
+        in_flight = deque()
+        last = start_after
+        while True:
+            rows = [tuple(row) for row in db.session.execute(select, {'last': last})]
+            db.session.commit()
+            if not rows:
+                break
+            last = rows[-1][0]
+            in_flight.append((rows, pool.submit(render_rows, rows, tags)))
+            if len(in_flight) > workers:
+                yield write(*in_flight.popleft())
+        while in_flight:
+            yield write(*in_flight.popleft())
+
+
+def prune_stored(models, chunk_size=1000):
+    """Delete ``rendered_html`` entries that no current body of ``models`` maps to.
+
+    Edits and renderer upgrades leave old digests behind.  The digests of
+    every stored body are collected first, then the table is swept in key
+    order, one chunk per commit.  An entry stored while this runs may be
+    swept too; that only costs one more render.  Returns the number deleted.
+    """
+    from .models import RenderedHtml
+    stored = RenderedHtml.__table__
+    min_length = current_app.config.get('FLASKY_RENDER_STORE_MIN_LENGTH', 256)
+    live = set()
+    for model in models:
+        table = model.__table__
+        tags = list(model.allowed_tags)
+        select = db.select([table.c.id, table.c.body]).where(table.c.id > db.bindparam('last')).\
+            order_by(table.c.id).limit(chunk_size)
+        last = 0
+        while True:
+            rows = db.session.execute(select, {'last': last}).fetchall()
+            db.session.commit()
+            if not rows:
+                break
+            last = rows[-1][0]
+            live.update(digest(body, tags) for _, body in rows if body is not None and len(body) >= min_length)
+    select = db.select([stored.c.digest]).where(stored.c.digest > db.bindparam('last')).\
+        order_by(stored.c.digest).limit(chunk_size)
+    deleted = 0
+    last = ''
+    while True:
+        keys = [row[0] for row in db.session.execute(select, {'last': last})]
+        if not keys:
+            break
+        last = keys[-1]
+        dead = [key for key in keys if key not in live]
+        if dead:
+            db.session.execute(stored.delete().where(stored.c.digest.in_(dead)))
+            deleted += len(dead)
+        db.session.commit()
+    return deleted
+
+
+def digest(source, tags):
+    """Key of ``source`` rendered with ``tags`` by this version of the pipeline."""
+    policy = '\x00'.join(sorted(tags))
+    return hashlib.sha1((_version + '\x01' + policy + '\x01' + source).encode('utf-8')).hexdigest()
+
+
+def _insert_ignore(table, dialect=None):
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == 'mysql':
+        return table.insert().prefix_with('IGNORE')
+    if dialect == 'sqlite':
+        return table.insert().prefix_with('OR IGNORE')
+    return table.insert()
+
+
+class MarkdownRenderer:
+    """Content-addressed cache in front of :func:`render_html`.
+
+    Results are keyed by a hash of the source, the tag policy and the
+    Markdown, bleach and :data:`RENDERER_VERSION` versions, and kept in an
+    in-memory LRU.  Sources of at least ``FLASKY_RENDER_STORE_MIN_LENGTH``
+    characters are also stored in the ``rendered_html`` table, so they
+    survive restarts and are shared between workers.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.cache = LRUCache(maxsize)
+        self.stored_hits = 0
+        self.renders = 0
+
+    def render(self, source, tags):
+        key = digest(source, tags)
+        html = self.cache.get(key)
+        if html is not None:
+            return html
+        stored = len(source) >= current_app.config.get('FLASKY_RENDER_STORE_MIN_LENGTH', 256)
+        if stored:
+            html = self._load(key)
+        if html is None:
+            start = time.perf_counter()
+            html = render_html(source, tags)
+            render_seconds.observe(time.perf_counter() - start)
+            self.renders += 1
+            if stored:
+                self._store(key, html)
+        else:
+            self.stored_hits += 1
+        self.cache.set(key, html)
+        return html
+
+    def _load(self, key):
+        from .models import RenderedHtml
+        table = RenderedHtml.__table__
+        return db.session.execute(db.select([table.c.html]).where(table.c.digest == key)).scalar()
+
+    def _store(self, key, html):
+        from .models import RenderedHtml
+        db.session.execute(_insert_ignore(RenderedHtml.__table__).values(digest=key, html=html))
+
+    def stats(self):
+        stats = self.cache.stats()
+        return {'memory_hits': stats['hits'], 'stored_hits': self.stored_hits,
+                'renders': self.renders, 'size': stats['size']}
+
+
+renderer = MarkdownRenderer()
@@ -0,0 +1,99 @@
+import random
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.expression import Select
+
+# Pool options that only a queue pool accepts; SQLite engines never get one.
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the reads of GET requests to a replica.
+
+    A replica is any bind named in ``FLASKY_DATABASE_REPLICAS``; one is
+    picked at random per session.  Flushes, writes, locking reads, reads
+    outside a request and reads of other requests go to the primary, as do
+    all reads of a session once it has written.  After a request commits a
+    change the client is pinned to the primary for
+    ``FLASKY_REPLICA_STICKY_SECONDS``, so it reads its own writes while the
+    replicas catch up.
+    """
+
+    def __init__(self, db, **options):
+        SignallingSession.__init__(self, db, **options)
+        self.db = db
+        self.replica = None
+        self.wrote = False
+
+    def use_replica(self, clause):
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        if self._flushing or self.wrote or not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return False
+        return time.time() >= max(g.get('db_primary_until', 0), session.get('db_primary_until', 0))
+
+    def get_bind(self, mapper=None, clause=None):
+        replicas = self.app.config['FLASKY_DATABASE_REPLICAS']
+        if replicas:
+            if isinstance(clause, UpdateBase):
+                self.wrote = True
+            elif self.use_replica(clause):
+                if self.replica is None:
+                    self.replica = self.db.get_engine(self.app, bind=random.choice(replicas))
+                return self.replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    @staticmethod
+    def on_flush(db_session, flush_context):
+        db_session.wrote = True
+
+    @staticmethod
+    def on_commit(db_session):
+        if db_session.wrote:
+            db_session.wrote = False
+            if has_request_context():
+                g.db_primary_until = time.time() + db_session.app.config['FLASKY_REPLICA_STICKY_SECONDS']
+
+    @staticmethod
+    def on_rollback(db_session, previous_transaction):
+        db_session.wrote = False
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """``SQLAlchemy`` whose sessions are :class:`RoutingSession` instances.
+
+    ``SQLALCHEMY_ENGINE_OPTIONS`` sizes the connection pools; the options
+    that only a queue pool accepts are dropped for SQLite engines.  Every
+    engine's connection checkouts are timed for the metrics.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('FLASKY_DATABASE_REPLICAS', [])
+        app.config.setdefault('FLASKY_REPLICA_STICKY_SECONDS', 5)
+        SQLAlchemy.init_app(self, app)
+        if app.config['FLASKY_DATABASE_REPLICAS']:
+            app.after_request(self.pin_to_primary)
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(factory, 'after_flush', RoutingSession.on_flush)
+        event.listen(factory, 'after_commit', RoutingSession.on_commit)
+        event.listen(factory, 'after_soft_rollback', RoutingSession.on_rollback)
+        return factory
+
+    def create_engine(self, sa_url, engine_opts):
+        if sa_url.drivername.startswith('sqlite'):
+            engine_opts = {key: value for key, value in engine_opts.items() if key not in QUEUE_POOL_OPTIONS}
+        from .metrics import time_checkouts
+        return time_checkouts(SQLAlchemy.create_engine(self, sa_url, engine_opts))
+
+    @staticmethod
+    def pin_to_primary(response):
+        until = g.get('db_primary_until')
+        if until is not None:
+            session['db_primary_until'] = until
+        return response
@@ -0,0 +1,187 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from . import db
+from .cache import LRUCache
+from .render import _insert_ignore
+
+# Scripts written without spaces between words are indexed one character
+# per term (kana and Han); everything else is split on non-word characters.
+CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile('[%s]|(?:(?![%s])\\w)+' % (CJK, CJK))
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_document_counts = LRUCache(maxsize=16, ttl=300)
+
+
+def normalize(text):
+    """Fold case and accents, so ``Café`` and ``cafe`` are the same term."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return [term[:MAX_TERM_LENGTH] for term in TOKEN_RE.findall(normalize(text or ''))]
+
+
+def postings(doc_type, doc_id, text):
+    return [{'term': term, 'doc_type': doc_type, 'doc_id': doc_id, 'tf': tf}
+            for term, tf in Counter(tokenize(text)).items()]
+
+
+def count_documents(connection, doc_type, terms, delta):
+    """Add ``delta`` to the document frequency of each of ``terms``."""
+    from .models import SearchFrequency
+    frequencies = SearchFrequency.__table__
+    terms = sorted(terms)
+    if delta > 0:
+        connection.execute(_insert_ignore(frequencies, connection.dialect.name),
+                           [{'term': term, 'doc_type': doc_type, 'df': 0} for term in terms])
+    connection.execute(frequencies.update().
+                       where(db.and_(frequencies.c.doc_type == doc_type, frequencies.c.term.in_(terms))).
+                       values(df=frequencies.c.df + delta))
+
+
+def remove_document(connection, doc_type, doc_id):
+    from .models import SearchTerm
+    table = SearchTerm.__table__
+    document = db.and_(table.c.doc_type == doc_type, table.c.doc_id == doc_id)
+    terms = [row[0] for row in connection.execute(db.select([table.c.term]).where(document))]
+    if terms:
+        connection.execute(table.delete().where(document))
+        count_documents(connection, doc_type, terms, -1)
+
+
+def index_document(connection, doc_type, doc_id, text):
+    """Replace the postings of one document; runs inside the flush."""
+    from .models import SearchTerm
+    remove_document(connection, doc_type, doc_id)
+    rows = postings(doc_type, doc_id, text)
+    if rows:
+        connection.execute(SearchTerm.__table__.insert(), rows)
+        count_documents(connection, doc_type, [row['term'] for row in rows], 1)
+
+
+def rebuild_frequencies(connection, doc_type):
+    """Recount the document frequencies of ``doc_type`` from its postings."""
+    from .models import SearchTerm, SearchFrequency
+    index = SearchTerm.__table__
+    frequencies = SearchFrequency.__table__
+    connection.execute(frequencies.delete().where(frequencies.c.doc_type == doc_type))
+    connection.execute(frequencies.insert().from_select(
+        ['term', 'doc_type', 'df'],
+        db.select([index.c.term, index.c.doc_type, db.func.count()]).
+        where(index.c.doc_type == doc_type).group_by(index.c.term, index.c.doc_type)))
+
+
+def reindex(model, chunk_size=1000):
+    """Rebuild the postings of every ``model`` document, one chunk per commit.
+
+    Searches of that type come back empty until the rebuild has finished.
+    Yields the number of documents indexed after each chunk.
+    """
+    from .models import SearchTerm, SearchFrequency
+    table = model.__table__
+    index = SearchTerm.__table__
+    frequencies = SearchFrequency.__table__
+    doc_type = model.search_doc_type
+    select = db.select([table.c.id, table.c.body]).where(table.c.id > db.bindparam('last')).\
+        order_by(table.c.id).limit(chunk_size)
+    db.session.execute(index.delete().where(index.c.doc_type == doc_type))
+    db.session.execute(frequencies.delete().where(frequencies.c.doc_type == doc_type))
+    last = 0
+    while True:
+        rows = db.session.execute(select, {'last': last}).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        entries = [entry for id, body in rows for entry in postings(doc_type, id, body)]
+        if entries:
+            db.session.execute(index.insert(), entries)
+        db.session.commit()
+        yield len(rows)
+    rebuild_frequencies(db.session.connection(), doc_type)
+    db.session.commit()
+    _document_counts.delete(doc_type)
+
+
+def document_count(model):
+    count = _document_counts.get(model.search_doc_type)
+    if count is None:
+        count = db.session.query(db.func.count(model.id)).scalar()
+        _document_counts.set(model.search_doc_type, count)
+    return count
+
+
+def rank(model, query, offset=0, limit=20):
+    """Return the ids of ``model`` documents containing every term of ``query``.
+
+    Documents are ordered by the sum of tf-idf over the query terms.  The
+    document frequencies are read from ``search_frequencies``; the postings
+    of the rarest term are the candidates and every other term is one
+    primary key lookup per candidate.  A single term is read in score order
+    from ``ix_search_terms_rank``, so only the rows of the page are touched.
+    """
+    from .models import SearchTerm, SearchFrequency
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    index = SearchTerm.__table__
+    frequencies = SearchFrequency.__table__
+    doc_type = model.search_doc_type
+    dfs = dict(db.session.execute(
+        db.select([frequencies.c.term, frequencies.c.df]).
+        where(db.and_(frequencies.c.doc_type == doc_type, frequencies.c.term.in_(terms),
+                      frequencies.c.df > 0))).fetchall())
+    if len(dfs) < len(terms):
+        return []
+    total = max(document_count(model), max(dfs.values()))
+    terms.sort(key=lambda term: dfs[term])
+    first = index.alias()
+    joined, score = first, first.c.tf * math.log(1.0 + total / dfs[terms[0]])
+    for term in terms[1:]:
+        other = index.alias()
+        joined = joined.join(other, db.and_(other.c.term == term, other.c.doc_type == doc_type,
+                                            other.c.doc_id == first.c.doc_id))
+        score = score + other.c.tf * math.log(1.0 + total / dfs[term])
+    if len(terms) == 1:
+        order = (first.c.tf.desc(), first.c.doc_id.desc())
+    else:
+        order = (score.desc(), first.c.doc_id.desc())
+    select = db.select([first.c.doc_id]).select_from(joined).\
+        where(db.and_(first.c.term == terms[0], first.c.doc_type == doc_type)).\
+        order_by(*order).offset(offset).limit(limit)
+    return [row[0] for row in db.session.execute(select)]
+
+
+class SearchPage:
+    """One page of ranked results, shaped for ``pagination_widget``."""
+    is_keyset = False
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = page > 1
+        self.next_num = page + 1
+        self.prev_num = page - 1
+
+    def iter_pages(self):
+        return range(1, self.page + 2 if self.has_next else self.page + 1)
+
+
+def search(model, query, page=1, per_page=20):
+    """Load one page of ``model`` documents matching ``query``, best first."""
+    from .feeds import with_authors
+    ids = rank(model, query, (page - 1) * per_page, per_page + 1)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    items = []
+    if ids:
+        found = {item.id: item for item in with_authors(model.query, model).filter(model.id.in_(ids))}
+        items = [found[id] for id in ids if id in found]
+    return SearchPage(items, page, per_page, has_next)
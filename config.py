@@ -18,8 +18,40 @@ class Config:
     DB_USERNAME = os.environ.get('DB_USERNAME')
     DB_PASSWORD = os.environ.get('DB_PASSWORD')
     SSL_REDIRECT = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
 
     FLASKY_POSTS_PER_PAGE = 10
+    FLASKY_LAST_SEEN_GRANULARITY = 60
+    FLASKY_LAST_SEEN_FLUSH_INTERVAL = 10
+    FLASKY_USER_CACHE_TTL = 60
+    FLASKY_RENDER_STORE_MIN_LENGTH = 256
+    FLASKY_MAIL_WORKERS = 2
+    FLASKY_MAIL_QUEUE_SIZE = 1000
+    FLASKY_MAIL_BATCH_SIZE = 20
+    FLASKY_MAIL_MAX_RETRIES = 3
+    FLASKY_MAIL_RETRY_BACKOFF = 1.0
+    FLASKY_MAIL_IDLE_TIMEOUT = 30
+    FLASKY_MAIL_ENQUEUE_TIMEOUT = 1.0
+    FLASKY_API_TOKEN_EXPIRATION = 3600
+    FLASKY_ETAG_SALT = os.environ.get('FLASKY_ETAG_SALT', '')
+    FLASKY_COMPRESS_MIN_SIZE = 500
+    FLASKY_COMPRESS_LEVEL = 6
+    FLASKY_FOLLOW_GRAPH_PATH = os.environ.get('FLASKY_FOLLOW_GRAPH_PATH')
+    FLASKY_FOLLOW_GRAPH_MAX_AGE = 3600
+    FLASKY_SQL_PROFILING = os.environ.get('FLASKY_SQL_PROFILING', '').lower() in \
+        ['true', 'on', '1']
+    FLASKY_SLOW_REQUEST_THRESHOLD = float(os.environ.get('FLASKY_SLOW_REQUEST_THRESHOLD', '0.5'))
+    FLASKY_N_PLUS_ONE_THRESHOLD = 5
+    FLASKY_METRICS = True
+    FLASKY_METRICS_ALLOW = os.environ.get('FLASKY_METRICS_ALLOW', '127.0.0.1/32,::1/128').split(',')
+    FLASKY_DATABASE_REPLICAS = []
+    FLASKY_REPLICA_STICKY_SECONDS = 5
 
     @staticmethod
     def init_app(app):
@@ -28,6 +60,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQLALCHEMY_ENGINE_OPTIONS = dict(Config.SQLALCHEMY_ENGINE_OPTIONS, pool_size=5, max_overflow=5)
     DB_CONFIG = {'host': 'localhost',
                  'user': Config.DB_USERNAME,
                  'password': Config.DB_PASSWORD,
@@ -37,6 +70,9 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    SQLALCHEMY_ENGINE_OPTIONS = dict(Config.SQLALCHEMY_ENGINE_OPTIONS, pool_size=2, max_overflow=0,
+                                     pool_pre_ping=False)
+    FLASKY_USER_CACHE_TTL = 0
     DB_CONFIG = {'host': 'localhost',
                  'user': Config.DB_USERNAME,
                  'password': Config.DB_PASSWORD,
@@ -50,29 +86,18 @@ class ProductionConfig(Config):
                  'password': Config.DB_PASSWORD,
                  'database': 'Flasky'}
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or Config.MYSQL_URL.format(**DB_CONFIG)
+    # DATABASE_REPLICA_URLS is a comma separated list of read replicas
+    SQLALCHEMY_BINDS = {'replica{}'.format(i): url for i, url in
+                        enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')))}
+    FLASKY_DATABASE_REPLICAS = sorted(SQLALCHEMY_BINDS)
 
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
 
-        # email errors to the administrators
-        import logging
-        from logging.handlers import SMTPHandler
-        credentials = None
-        secure = None
-        if getattr(cls, 'MAIL_USERNAME', None) is not None:
-            credentials = (cls.MAIL_USERNAME, cls.MAIL_PASSWORD)
-            if getattr(cls, 'MAIL_USE_TLS', None):
-                secure = ()
-        mail_handler = SMTPHandler(
-            mailhost=(cls.MAIL_SERVER, cls.MAIL_PORT),
-            fromaddr=cls.FLASK_MAIL_SENDER,
-            toaddrs=[cls.FLASK_ADMIN],
-            subject='[Test]Application Error',
-            credentials=credentials,
-            secure=secure)
-        mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
+        # email errors to the administrators, batched in the background
+        from app.error_reporting import error_reporter
+        error_reporter.init_app(app)
 
 
 class HerokuConfig(ProductionConfig):
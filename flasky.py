@@ -1,8 +1,11 @@
 import os
+import json
+import time
+import click
 from dotenv import load_dotenv
 from flask_migrate import Migrate, upgrade
 from app import create_app, db
-from app.models import Role, User
+from app.models import Role, User, Post, Comment, Timeline
 
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -26,13 +29,147 @@ def test():
 @app.cli.command()
 def deploy():
     """Run deployment task"""
+    from app.compress import precompress_static
     upgrade()
     Role.insert_roles()
+    click.echo('Precompressed {} static files.'.format(precompress_static(app)))
+
+
+@app.cli.command()
+@click.option('--username', default=None, help='Only rebuild the timeline of this user.')
+def rebuild_timeline(username):
+    """Rebuild the materialized home timelines"""
+    user = None
+    if username is not None:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter('no such user: {}'.format(username))
+    Timeline.rebuild(user)
+
+
+@app.cli.command()
+def reconcile_counters():
+    """Repair drifted comment, follower and following counters"""
+    posts = Post.reconcile_counters()
+    users = User.reconcile_counters()
+    db.session.commit()
+    click.echo('Repaired {} posts and {} users.'.format(posts, users))
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=1000, help='Rows per query and per render task.')
+@click.option('--workers', default=None, type=int, help='Render processes, defaults to the CPU count.')
+@click.option('--state-file', default='.rerender-state.json', help='Where progress is saved for resuming.')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first row.')
+def rerender(chunk_size, workers, state_file, restart):
+    """Re-render body_html of all posts and comments, and prune stored HTML"""
+    from app.render import rerender as rerender_model, prune_stored
+    state = {}
+    if not restart and os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+    for model in (Post, Comment):
+        name = model.__tablename__
+        start = time.monotonic()
+        total = 0
+        if state.get(name):
+            click.echo('{}: resuming after id {}'.format(name, state[name]))
+        for last_id, rows in rerender_model(model, chunk_size, workers, state.get(name, 0)):
+            total += rows
+            state[name] = last_id
+            with open(state_file, 'w') as f:
+                json.dump(state, f)
+            elapsed = time.monotonic() - start
+            click.echo('{}: {} rows up to id {}, {:.0f} rows/s'.format(name, total, last_id, total / elapsed))
+        click.echo('{}: done, {} rows in {:.1f}s'.format(name, total, time.monotonic() - start))
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    click.echo('rendered_html: pruned {} unused entries'.format(prune_stored((Post, Comment), chunk_size)))
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=1000, help='Documents per query and per commit.')
+def reindex_search(chunk_size):
+    """Rebuild the search index of posts and comments"""
+    from app.search import reindex
+    for model in (Post, Comment):
+        start = time.monotonic()
+        total = 0
+        for rows in reindex(model, chunk_size):
+            total += rows
+        click.echo('{}: {} documents in {:.1f}s'.format(model.__tablename__, total, time.monotonic() - start))
+
+
+@app.cli.command()
+@click.option('--path', default=None, help='Snapshot file, defaults to FLASKY_FOLLOW_GRAPH_PATH.')
+def rebuild_follow_graph(path):
+    """Write a fresh follow graph snapshot for the app workers"""
+    from app.graph import FollowGraph
+    path = path or app.config.get('FLASKY_FOLLOW_GRAPH_PATH')
+    if not path:
+        raise click.UsageError('set FLASKY_FOLLOW_GRAPH_PATH or pass --path')
+    start = time.monotonic()
+    built_at = time.time()
+    sources, offsets, targets = FollowGraph.build()
+    FollowGraph.save(path, (sources, offsets, targets), built_at)
+    click.echo('{} follows of {} users in {:.1f}s'.format(len(targets), len(sources), time.monotonic() - start))
+
+
+@app.cli.command()
+def explain_audit():
+    """EXPLAIN the feed queries; fails on full scans and filesorts"""
+    from app.explain import audit
+    post = Post.query.order_by(Post.id).first()
+    if post is None:
+        raise click.UsageError('the audit needs at least one post, see flask fake')
+    failed = 0
+    for name, issues in audit(post.author, post):
+        click.echo('{:<30} {}'.format(name, '; '.join(issues) if issues else 'ok'))
+        failed += bool(issues)
+    if failed:
+        click.echo('{} queries need an index.'.format(failed), err=True)
+        raise SystemExit(1)
+
+
+@app.cli.command()
+@click.argument('username')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Defaults to standard output.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export_user(username, output, compress):
+    """Export a user's posts, comments and follows as NDJSON"""
+    from app.export import export_records, ndjson, gzipped
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter('no such user: {}'.format(username))
+    lines = ndjson(export_records(user))
+    chunks = gzipped(lines) if compress else (line.encode('utf-8') for line in lines)
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@app.cli.command()
+@click.option('--users', default=1000, help='Users to create.')
+@click.option('--posts', default=10000, help='Posts to create.')
+@click.option('--comments', default=20000, help='Comments to create.')
+@click.option('--follows', default=20, help='Average number of accounts each new user follows.')
+@click.option('--seed', default=0, help='Seed for reproducible data.')
+@click.option('--batch-size', default=5000, help='Rows per INSERT and per commit.')
+@click.option('--workers', default=None, type=int, help='Render processes, defaults to the CPU count.')
+def fake(users, posts, comments, follows, seed, batch_size, workers):
+    """Fill the database with synthetic data for load testing"""
+    from app.fake import BulkGenerator
+    start = time.monotonic()
+    generator = BulkGenerator(seed, batch_size, workers)
+
+    def progress(message):
+        click.echo('{:7.1f}s {}'.format(time.monotonic() - start, message))
+
+    generator.run(users, posts, comments, follows, progress)
 
 
 @app.shell_context_processor
 def make_shell_context():
-    return dict(db=db, User=User, Role=Role)
+    return dict(db=db, User=User, Role=Role, Post=Post, Timeline=Timeline)
 
 
 if __name__ == '__main__':
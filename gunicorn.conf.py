@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+# Workers share their Prometheus samples through files in this directory.
+# It has to be set before the workers import prometheus_client, and it is
+# emptied on start so counters from a previous run are not reported.
+multiproc_dir = os.environ.setdefault('prometheus_multiproc_dir',
+                                      os.path.join(tempfile.gettempdir(), 'flasky-metrics'))
+
+
+def on_starting(server):
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,30 @@
+"""search terms binary collation
+
+Revision ID: 4c1d7e92b0f3
+Revises: 95d39568fd82
+Create Date: 2020-09-06 15:02:11.384512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1d7e92b0f3'
+down_revision = '95d39568fd82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # only MySQL collations can make distinct terms compare equal
+    if op.get_bind().dialect.name == 'mysql':
+        op.alter_column('search_terms', 'term', existing_type=sa.String(length=64), existing_nullable=False,
+                        type_=mysql.VARCHAR(length=64, collation='utf8mb4_bin'))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.alter_column('search_terms', 'term', existing_type=mysql.VARCHAR(length=64, collation='utf8mb4_bin'),
+                        existing_nullable=False, type_=sa.String(length=64))
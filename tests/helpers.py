@@ -0,0 +1,91 @@
+import contextlib
+from sqlalchemy import event
+from app import db
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Collect the SQL statements executed inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextlib.contextmanager
+def assert_num_queries(testcase, num):
+    with count_queries() as statements:
+        yield statements
+    testcase.assertEqual(len(statements), num,
+                         'expected {} queries, got {}:\n{}'.format(num, len(statements), '\n'.join(statements)))
+
+
+class SMTPStandIn:
+    """Minimal in-process SMTP server recording the messages it accepts.
+
+    The first ``refuse`` connections are answered with a 421 and closed.
+    """
+
+    def __init__(self, refuse=0):
+        import socketserver
+        import threading
+
+        standin = self
+        self.messages = []
+        self.connections = 0
+        self.refuse = refuse
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                standin.connections += 1
+                if standin.refuse > 0:
+                    standin.refuse -= 1
+                    self.reply('421 try again later')
+                    return
+                self.reply('220 localhost ready')
+                envelope = {}
+                for raw in self.rfile:
+                    command = raw.decode('ascii').strip()
+                    verb = command[:4].upper()
+                    if verb == 'DATA':
+                        self.reply('354 go ahead')
+                        lines = []
+                        for data in self.rfile:
+                            if data in (b'.\r\n', b'.\n'):
+                                break
+                            lines.append(data)
+                        envelope['data'] = b''.join(lines)
+                        standin.messages.append(envelope)
+                        envelope = {}
+                        self.reply('250 queued')
+                    elif verb == 'MAIL':
+                        envelope['from'] = command[10:]
+                        self.reply('250 ok')
+                    elif verb == 'RCPT':
+                        envelope.setdefault('to', []).append(command[8:])
+                        self.reply('250 ok')
+                    elif verb == 'QUIT':
+                        self.reply('221 bye')
+                        return
+                    else:
+                        self.reply('250 localhost')
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
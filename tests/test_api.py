@@ -0,0 +1,149 @@
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, Post, user_cache
+from app.api.authentication import token_cache, verify_token, verify_password
+from helpers import assert_num_queries
+
+
+class APITestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_USER_CACHE_TTL'] = 60
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user_cache.clear()
+        token_cache.clear()
+        self.user = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_api_headers(self, username, password):
+        return {
+            'Authorization': 'Basic ' + b64encode(
+                (username + ':' + password).encode('utf-8')).decode('utf-8'),
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+
+    def test_no_auth(self):
+        response = self.client.post('/api/v1/tokens', headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_bad_password(self):
+        response = self.client.post('/api/v1/tokens', headers=self.get_api_headers('john@example.com', 'dog'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_auth(self):
+        response = self.client.post('/api/v1/tokens', headers=self.get_api_headers('john@example.com', 'cat'))
+        self.assertEqual(response.status_code, 200)
+        token = response.get_json()['token']
+
+        response = self.client.post('/api/v1/tokens', headers=self.get_api_headers('bad-token', ''))
+        self.assertEqual(response.status_code, 401)
+
+        # tokens cannot be used to issue new tokens
+        response = self.client.post('/api/v1/tokens', headers=self.get_api_headers(token, ''))
+        self.assertEqual(response.status_code, 401)
+
+        # once verified, a token costs no queries
+        self.assertEqual(verify_token(token), self.user.id)
+        with self.app.test_request_context():
+            db.session.remove()
+            with assert_num_queries(self, 0):
+                self.assertTrue(verify_password(token, ''))
+
+    def test_confirmation_tokens_are_rejected(self):
+        self.assertIsNone(verify_token(self.user.generate_token()))
+        self.assertIsNone(verify_token('not a token'))
+
+    def test_unconfirmed_account(self):
+        self.user.confirmed = False
+        db.session.commit()
+        response = self.client.post('/api/v1/tokens', headers=self.get_api_headers('john@example.com', 'cat'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_posts(self):
+        headers = self.get_api_headers('john@example.com', 'cat')
+        response = self.client.post('/api/v1/posts/', headers=headers, data=json.dumps({'body': ''}))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/posts/', headers=headers, data=json.dumps({'body': '*hello*'}))
+        self.assertEqual(response.status_code, 201)
+        url = response.headers['Location']
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.get_json()['body_html'], '<p><em>hello</em></p>')
+
+        response = self.client.put(url, headers=headers, data=json.dumps({'body': 'updated'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Post.query.one().body, 'updated')
+
+        other = User(email='susan@example.com', username='susan', password='dog', confirmed=True)
+        db.session.add(other)
+        db.session.commit()
+        response = self.client.put(url, headers=self.get_api_headers('susan@example.com', 'dog'),
+                                   data=json.dumps({'body': 'mine'}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_pagination_and_projection(self):
+        posts = [Post(body='post %d' % i, author=self.user) for i in range(7)]
+        db.session.add_all(posts)
+        db.session.commit()
+        headers = self.get_api_headers('john@example.com', 'cat')
+        seen = []
+        url = '/api/v1/posts/?per_page=3&fields=url,timestamp'
+        while url:
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            page = response.get_json()
+            for post in page['posts']:
+                self.assertEqual(sorted(post), ['timestamp', 'url'])
+            seen.extend(post['url'] for post in page['posts'])
+            url = page['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+        response = self.client.get('/api/v1/posts/?fields=password_hash', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_multi_get(self):
+        posts = [Post(body='post %d' % i, author=self.user) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+        ids = [posts[2].id, 999, posts[0].id]
+        headers = self.get_api_headers('john@example.com', 'cat')
+        response = self.client.get('/api/v1/posts/?fields=body&ids=' + ','.join(map(str, ids)), headers=headers)
+        page = response.get_json()
+        self.assertEqual([post['body'] for post in page['posts']], ['post 2', 'post 0'])
+        self.assertEqual(page['missing'], [999])
+
+        response = self.client.get('/api/v1/users/?ids=%d' % self.user.id, headers=headers)
+        self.assertEqual(response.get_json()['users'][0]['username'], 'john')
+        self.assertNotIn('email', response.get_json()['users'][0])
+        self.assertEqual(self.client.get('/api/v1/users/?ids=a', headers=headers).status_code, 400)
+
+    def test_comments_and_timeline(self):
+        headers = self.get_api_headers('john@example.com', 'cat')
+        post = Post(body='hello', author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        response = self.client.post('/api/v1/posts/%d/comments/' % post.id, headers=headers,
+                                    data=json.dumps({'body': 'first'}))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/v1/posts/%d/comments/' % post.id, headers=headers)
+        self.assertEqual([c['body'] for c in response.get_json()['comments']], ['first'])
+        response = self.client.get('/api/v1/users/%d/timeline/' % self.user.id, headers=headers)
+        self.assertEqual([p['body'] for p in response.get_json()['posts']], ['hello'])
+        self.assertEqual(self.client.get('/api/v1/posts/999', headers=headers).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post
+from app.compress import precompress_static
+
+
+class CompressTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_dynamic_pages(self):
+        user = User(email='john@example.com', username='john', password='cat')
+        db.session.add_all([user] + [Post(body='long post ' * 50, author=user) for _ in range(5)])
+        db.session.commit()
+        plain = self.client.get('/')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'long post', gzip.decompress(response.data))
+        self.assertEqual(response.headers['ETag'], plain.headers['ETag'])
+
+    def test_small_and_excluded_responses(self):
+        self.app.config['FLASKY_COMPRESS_MIN_SIZE'] = 10 ** 6
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.app.config['FLASKY_COMPRESS_MIN_SIZE'] = 0
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_precompressed_static(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        with open(os.path.join(folder, 'site.css'), 'w') as f:
+            f.write('body { margin: 0; }\n' * 100)
+        with open(os.path.join(folder, 'tiny.css'), 'w') as f:
+            f.write('p {}')
+        self.app.static_folder = folder
+        self.assertGreaterEqual(precompress_static(self.app), 1)
+        self.assertFalse(os.path.exists(os.path.join(folder, 'tiny.css.gz')))
+        self.assertEqual(precompress_static(self.app), 0)
+
+        response = self.client.get('/static/site.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(gzip.decompress(response.get_data()), b'body { margin: 0; }\n' * 100)
+        response.close()
+        response = self.client.get('/static/site.css')
+        self.assertNotIn('Content-Encoding', response.headers)
+        response.close()
@@ -0,0 +1,94 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+from app.main.fragments import fragment_cache
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        fragment_cache.clear()
+        self.user = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        self.post = Post(body='hello', author=self.user)
+        db.session.add_all([self.user, self.post])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertIn('no-cache', first.headers['Cache-Control'])
+        return etag, first.headers.get('Last-Modified')
+
+    def test_not_modified(self):
+        for url in ('/', '/user/john', '/post/%d' % self.post.id):
+            etag, last_modified = self.revalidate(url)
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            if last_modified is not None:
+                response = self.client.get(url, headers={'If-Modified-Since': last_modified})
+                self.assertEqual(response.status_code, 304)
+
+    def test_profile_is_not_validated_by_date(self):
+        _, last_modified = self.revalidate('/user/john')
+        self.assertIsNone(last_modified)
+        susan = User(email='susan@example.com', username='susan', password='dog', confirmed=True)
+        john = User.query.first()
+        john.about_me = 'changed'
+        susan.follow(john)
+        db.session.add(susan)
+        db.session.commit()
+        response = self.client.get('/user/john', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'changed', response.data)
+
+    def test_etag_wins_over_date(self):
+        etag, last_modified = self.revalidate('/')
+        response = self.client.get('/', headers={'If-None-Match': 'W/"stale"',
+                                                 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+
+    def test_edit_changes_etag(self):
+        etag, _ = self.revalidate('/post/%d' % self.post.id)
+        post = Post.query.first()
+        post.body = 'hello again'
+        db.session.commit()
+        response = self.client.get('/post/%d' % post.id, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'hello again', response.data)
+
+    def test_comment_and_rename_change_etag(self):
+        url = '/post/%d' % self.post.id
+        etag, _ = self.revalidate(url)
+        db.session.add(Comment(body='first', post=Post.query.first(), author=self.user))
+        db.session.commit()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+        etag, _ = self.revalidate('/user/john')
+        user = User.query.first()
+        user.about_me = 'changed'
+        db.session.commit()
+        self.assertEqual(self.client.get('/user/john', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_viewer_is_part_of_etag(self):
+        etag, _ = self.revalidate('/user/john')
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        response = self.client.get('/user/john', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_with_forms_are_not_validated(self):
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        self.assertNotIn('ETag', self.client.get('/').headers)
+        self.assertNotIn('ETag', self.client.get('/post/%d' % self.post.id).headers)
@@ -0,0 +1,61 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+
+
+class CountersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        self.post = Post(body='hello', author=self.u1)
+        db.session.add_all([self.u1, self.u2, self.post])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_comment_count(self):
+        c1 = Comment(body='one', post=self.post, author=self.u2)
+        c2 = Comment(body='two', post=self.post, author=self.u2)
+        db.session.add_all([c1, c2])
+        db.session.commit()
+        self.assertEqual(self.post.comment_count, 2)
+        db.session.delete(c1)
+        db.session.commit()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_follow_counts(self):
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual((self.u1.followed_count, self.u1.followers_count), (1, 0))
+        self.assertEqual((self.u2.followed_count, self.u2.followers_count), (0, 1))
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.followed_count, 0)
+        self.assertEqual(self.u2.followers_count, 0)
+
+    def test_reconcile(self):
+        self.u1.follow(self.u2)
+        db.session.add(Comment(body='one', post=self.post, author=self.u2))
+        db.session.commit()
+        db.session.execute(User.__table__.update().values(followers_count=7, followed_count=7))
+        db.session.execute(Post.__table__.update().values(comment_count=7))
+        db.session.commit()
+        self.assertEqual(Post.reconcile_counters(), 1)
+        self.assertEqual(User.reconcile_counters(), 2)
+        db.session.commit()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.u2.followers_count, 1)
+        self.assertEqual(self.u1.followers_count, 0)
+        self.assertEqual(User.reconcile_counters(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from flask_mail import Message
+from app import create_app, mail
+from app.email import mail_dispatcher
+from helpers import SMTPStandIn
+
+
+class MailDispatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.app = create_app('testing')
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=self.smtp.port,
+                               MAIL_USE_SSL=False, MAIL_USERNAME=None, MAIL_SUPPRESS_SEND=False,
+                               FLASKY_MAIL_RETRY_BACKOFF=0.01)
+        mail.init_app(self.app)
+        mail_dispatcher.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        mail_dispatcher.stop()
+        self.app_context.pop()
+        self.smtp.close()
+
+    def message(self, i):
+        return Message('hello %d' % i, sender='flasky@example.com',
+                       recipients=['user%d@example.com' % i], body='body %d' % i)
+
+    def test_burst_reuses_connections(self):
+        for i in range(30):
+            self.assertTrue(mail_dispatcher.submit(self.message(i)))
+        mail_dispatcher.queue.join()
+        self.assertEqual(len(self.smtp.messages), 30)
+        self.assertLessEqual(self.smtp.connections, self.app.config['FLASKY_MAIL_WORKERS'])
+        stats = mail_dispatcher.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['queued']), (30, 0, 0))
+
+    def test_retry_after_refused_connection(self):
+        self.smtp.refuse = 2
+        self.app.config['FLASKY_MAIL_WORKERS'] = 1
+        mail_dispatcher.submit(self.message(0))
+        mail_dispatcher.queue.join()
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(self.smtp.connections, 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.smtp.refuse = 100
+        self.app.config['FLASKY_MAIL_MAX_RETRIES'] = 1
+        mail_dispatcher.submit(self.message(0))
+        mail_dispatcher.queue.join()
+        self.assertEqual(self.smtp.messages, [])
+        self.assertEqual(mail_dispatcher.stats()['failed'], 1)
+
+    def test_broken_message_does_not_stop_worker(self):
+        self.app.config['FLASKY_MAIL_WORKERS'] = 1
+        self.app.logger.disabled = True
+        self.addCleanup(setattr, self.app.logger, 'disabled', False)
+        mail_dispatcher.submit(Message('no recipients', sender='flasky@example.com', body='body'))
+        mail_dispatcher.submit(self.message(1))
+        mail_dispatcher.queue.join()
+        self.assertEqual(len(self.smtp.messages), 1)
+        stats = mail_dispatcher.stats()
+        self.assertEqual((stats['sent'], stats['failed']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import email
+import logging
+import sys
+import time
+import unittest
+from unittest import mock
+from app import create_app
+from app.error_reporting import error_reporter, fingerprint
+from helpers import SMTPStandIn
+
+
+class ErrorReportingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.app = create_app('testing')
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=self.smtp.port, MAIL_USERNAME=None,
+                               FLASK_MAIL_SENDER='flasky@example.com', FLASK_ADMIN='admin@example.com',
+                               PROPAGATE_EXCEPTIONS=False, FLASKY_ERROR_DIGEST_INTERVAL=3600)
+        error_reporter.init_app(self.app)
+        self.app.logger.propagate = False
+
+        @self.app.route('/fail/<int:n>')
+        def fail(n):
+            return {}[n]
+
+    def tearDown(self):
+        error_reporter.stop()
+        for handler in list(self.app.logger.handlers):
+            self.app.logger.removeHandler(handler)
+        self.smtp.close()
+
+    def flush(self):
+        error_reporter.queue.join()
+        error_reporter.flush()
+
+    def body(self, i=-1):
+        return self.message(i).get_payload(decode=True).decode('utf-8')
+
+    def message(self, i=-1):
+        return email.message_from_bytes(self.smtp.messages[i]['data'])
+
+    def test_identical_errors_are_grouped(self):
+        client = self.app.test_client()
+        for n in range(5):
+            self.assertEqual(client.get('/fail/{}'.format(n)).status_code, 500)
+        self.app.logger.error('disk is full')
+        self.flush()
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(self.message()['Subject'], 'Application Error (6 errors, 2 distinct)')
+        body = self.body()
+        self.assertIn('5 times', body)
+        self.assertIn('e.g. GET http://localhost/fail/0', body)
+        self.assertEqual(body.count('KeyError'), 1)
+
+        client.get('/fail/9')
+        self.flush()
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertIn('traceback mailed before', self.body())
+        self.assertNotIn('KeyError', self.body())
+
+    def test_empty_messages(self):
+        for _ in range(2):
+            try:
+                {}['key']
+            except KeyError:
+                self.app.logger.exception('')
+            self.app.logger.error('')
+            self.flush()
+        self.assertIn("KeyError: 'key' (traceback mailed before)", self.body())
+        self.assertEqual(len(self.smtp.messages), 2)
+
+    def test_failed_flush_keeps_thread(self):
+        self.app.config['FLASKY_ERROR_DIGEST_INTERVAL'] = 0.01
+        logging.getLogger('flasky.errors').disabled = True
+        self.addCleanup(setattr, logging.getLogger('flasky.errors'), 'disabled', False)
+        with mock.patch.object(error_reporter, 'digest', side_effect=RuntimeError):
+            self.app.logger.error('first')
+            error_reporter.queue.join()
+            time.sleep(0.1)
+        self.assertTrue(error_reporter.flusher.is_alive())
+
+    def test_no_mail_without_errors(self):
+        self.app.logger.warning('only a warning')
+        error_reporter.flush()
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_logging_does_not_wait_for_smtp(self):
+        self.smtp.close()
+        start = time.monotonic()
+        for n in range(100):
+            self.app.logger.error('error %d', n)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_full_queue_drops(self):
+        self.app.config['FLASKY_ERROR_QUEUE_SIZE'] = 2
+        error_reporter.init_app(self.app)
+        with error_reporter.lock:
+            # the listener thread cannot hand records over while this is held
+            for n in range(5):
+                self.app.logger.error('error %d', n)
+            self.assertGreaterEqual(error_reporter.dropped, 2)
+        self.flush()
+        self.assertIn('5 errors in 1 groups', self.body())
+        self.assertIn('dropped because the report queue was full', self.body())
+
+    def test_fingerprint(self):
+        def record(n):
+            try:
+                {}[n]
+            except KeyError:
+                return logging.LogRecord('app', logging.ERROR, __file__, 1, 'boom %s', (n,), sys.exc_info())
+        self.assertEqual(fingerprint(record(1)), fingerprint(record(2)))
+        plain = logging.LogRecord('app', logging.ERROR, __file__, 1, 'boom %s', (1,), None)
+        self.assertEqual(fingerprint(plain), fingerprint(logging.LogRecord('app', logging.ERROR, __file__, 1,
+                                                                          'boom %s', (2,), None)))
+        self.assertNotEqual(fingerprint(plain), fingerprint(record(1)))
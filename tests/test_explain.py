@@ -0,0 +1,58 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+from app.explain import audit, mysql_issues, postgresql_issues, sqlite_issues
+
+
+class ExplainTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(email='john@example.com', username='john', password='cat')
+        self.post = Post(body='a post', author=self.user)
+        db.session.add_all([self.user, self.post, Comment(body='a comment', post=self.post, author=self.user)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_indexed_queries_pass(self):
+        if db.engine.dialect.name != 'sqlite':
+            self.skipTest('small tables are only planned predictably on sqlite')
+        results = dict(audit(self.user, self.post))
+        self.assertIn('post comments, later page', results)
+        self.assertEqual({name: issues for name, issues in results.items() if issues}, {})
+
+    def test_missing_index_fails(self):
+        if db.engine.dialect.name != 'sqlite':
+            self.skipTest('small tables are only planned predictably on sqlite')
+        db.session.execute('DROP INDEX ix_comments_post_timestamp')
+        db.session.execute('DROP INDEX ix_comments_timestamp')
+        db.session.commit()
+        results = dict(audit(self.user, self.post))
+        self.assertIn('full scan of comments', results['post comments'])
+        self.assertIn('filesort (order by)', results['post comments'])
+        self.assertEqual(results['index'], [])
+
+    def test_sqlite_plans(self):
+        self.assertEqual(sqlite_issues(['SCAN post USING INDEX ix_post_timestamp'], filtered=False), [])
+        self.assertEqual(sqlite_issues(['SCAN post USING INDEX ix_post_timestamp']), ['full scan of post'])
+        self.assertEqual(sqlite_issues(['SEARCH post USING INDEX ix_post_author_timestamp (author_id=?)']), [])
+
+    def test_mysql_plans(self):
+        rows = [{'table': 'comments', 'type': 'ref', 'Extra': 'Using where; Using filesort'},
+                {'table': 'users_1', 'type': 'eq_ref', 'Extra': None},
+                {'table': 'roles_1', 'type': 'ALL', 'Extra': ''}]
+        self.assertEqual(mysql_issues(rows), ['filesort on comments', 'full scan of roles_1'])
+
+    def test_postgresql_plans(self):
+        plan = {'Node Type': 'Limit', 'Plans': [
+            {'Node Type': 'Sort', 'Sort Key': ['post."timestamp" DESC', 'post.id DESC'], 'Plans': [
+                {'Node Type': 'Seq Scan', 'Relation Name': 'post'}]}]}
+        self.assertEqual(postgresql_issues(plan),
+                         ['filesort (post."timestamp" DESC, post.id DESC)', 'full scan of post'])
@@ -0,0 +1,60 @@
+import gzip
+import json
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+from app.export import export_records
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.john = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        self.susan = User(email='susan@example.com', username='susan', password='dog', confirmed=True)
+        db.session.add_all([self.john, self.susan])
+        db.session.commit()
+        post = Post(body='first post', author=self.john)
+        db.session.add_all([post, Post(body='second', author=self.susan),
+                            Comment(body='nice', post=post, author=self.john)])
+        self.john.follow(self.susan)
+        self.susan.follow(self.john)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_records(self):
+        records = list(export_records(self.john, chunk_size=1))
+        self.assertEqual([r['type'] for r in records], ['user', 'post', 'comment', 'following', 'follower'])
+        self.assertEqual(records[1]['body'], 'first post')
+        self.assertEqual(records[3]['username'], 'susan')
+
+    def test_records_are_paged_by_id(self):
+        db.session.add_all([Post(body='post %d' % i, author=self.john) for i in range(4)])
+        db.session.commit()
+        records = [r for r in export_records(self.john, chunk_size=2) if r['type'] == 'post']
+        self.assertEqual([r['body'] for r in records], ['first post'] + ['post %d' % i for i in range(4)])
+
+    def test_download(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        response = client.get('/user/john/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        self.assertEqual(lines[0]['email'], 'john@example.com')
+        self.assertEqual(len(lines), 5)
+
+        response = client.get('/user/john/export?gzip=1')
+        self.assertIn('john.ndjson.gz', response.headers['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(response.data).splitlines()), 5)
+
+        self.assertEqual(client.get('/user/susan/export').status_code, 403)
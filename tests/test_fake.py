@@ -0,0 +1,59 @@
+import unittest
+from app import create_app, db
+from app.fake import BulkGenerator
+from app.models import User, Role, Post, Comment, Follow, Timeline
+from app.search import rank
+
+
+class BulkGeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def snapshot(self):
+        return ([(u.id, u.username, u.member_since) for u in User.query.order_by(User.id)],
+                [(p.id, p.author_id, p.body, p.timestamp) for p in Post.query.order_by(Post.id)],
+                db.session.query(Follow.follower_id, Follow.followed_id).order_by(
+                    Follow.follower_id, Follow.followed_id).all())
+
+    def generate(self):
+        return BulkGenerator(seed=7, batch_size=50, workers=1).run(users=30, posts=120, comments=200, follows=5)
+
+    def test_generate(self):
+        counts = self.generate()
+        self.assertEqual(counts['users'], 30)
+        self.assertEqual(Post.query.count(), 120)
+        self.assertEqual(Comment.query.count(), 200)
+        self.assertEqual(Follow.query.count(), counts['follows'])
+
+        post = Post.query.first()
+        self.assertTrue(post.body_html.startswith('<p>'))
+        self.assertEqual(post.comment_count, post.comments.count())
+        self.assertEqual(Post.reconcile_counters(), 0)
+        self.assertEqual(User.reconcile_counters(), 0)
+        self.assertEqual(Timeline.query.filter_by(user_id=post.author_id, post_id=post.id).count(), 1)
+        self.assertIn(post.id, rank(Post, post.body.split()[0].strip('*'), limit=200))
+
+        # the generated ids do not collide with rows added later
+        user = User(email='new@example.com', username='new', password='cat')
+        db.session.add(user)
+        db.session.add(Post(body='new', author=user))
+        db.session.commit()
+
+    def test_seed_is_reproducible(self):
+        self.generate()
+        first = self.snapshot()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
@@ -0,0 +1,97 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment, user_cache
+from app.last_seen import last_seen_buffer
+from helpers import count_queries, assert_num_queries
+
+
+class FeedQueriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL'] = 3600
+        self.app.config['FLASKY_USER_CACHE_TTL'] = 60
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user_cache.clear()
+        self.users = [User(email='user%d@example.com' % i, username='user%d' % i,
+                           password='cat', confirmed=True) for i in range(5)]
+        db.session.add_all(self.users)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        last_seen_buffer.flush()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_posts(self, count):
+        posts = [Post(body='post %d' % i, author=self.users[i % len(self.users)]) for i in range(count)]
+        db.session.add_all(posts)
+        db.session.commit()
+        return posts
+
+    def queries_for(self, url):
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_index_query_count_is_constant(self):
+        self.add_posts(2)
+        few = self.queries_for('/')
+        self.add_posts(20)
+        self.assertEqual(self.queries_for('/'), few)
+        db.session.remove()
+        with assert_num_queries(self, 1):
+            self.client.get('/')
+
+    def test_authenticated_index(self):
+        self.add_posts(20)
+        self.client.post('/auth/login', data={'email': 'user0@example.com', 'password': 'cat'})
+        self.queries_for('/')
+        # only the feed: the user comes from the cache and last_seen is buffered
+        self.assertEqual(self.queries_for('/'), 1)
+
+    def test_post_page_query_count_is_constant(self):
+        post = self.add_posts(1)[0]
+        db.session.add(Comment(body='first', post=post, author=self.users[1]))
+        db.session.commit()
+        few = self.queries_for('/post/%d' % post.id)
+        db.session.add_all([Comment(body='more', post=post, author=u) for u in self.users])
+        db.session.commit()
+        self.assertEqual(self.queries_for('/post/%d' % post.id), few)
+
+    def test_profile_is_paginated(self):
+        self.app.config['FLASKY_POSTS_PER_PAGE'] = 3
+        posts = [Post(body='entry %d' % i, author=self.users[0]) for i in range(7)]
+        db.session.add_all(posts)
+        db.session.commit()
+        few = self.queries_for('/user/user0')
+        db.session.add_all([Post(body='entry', author=self.users[0]) for _ in range(20)])
+        db.session.commit()
+        self.assertEqual(self.queries_for('/user/user0'), few)
+        response = self.client.get('/user/user0')
+        self.assertEqual(response.data.count(b'<li class="post">'), 3)
+        self.assertIn(b'Load more', response.data)
+
+    def test_profile_fragments(self):
+        self.app.config['FLASKY_POSTS_PER_PAGE'] = 3
+        db.session.add_all([Post(body='entry %d' % i, author=self.users[0]) for i in range(7)])
+        db.session.commit()
+        url, seen = '/user/user0/posts', 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data.strip().startswith(b'<ul class="posts">'))
+            seen += response.data.count(b'<li class="post">')
+            url = response.headers.get('X-Next-Page')
+        self.assertEqual(seen, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role
+from helpers import assert_num_queries
+
+
+class FollowStatesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.users = [User(email='user%d@example.com' % i, username='user%d' % i,
+                           password='cat', confirmed=True) for i in range(4)]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_states(self):
+        me, a, b, c = self.users
+        me.follow(a)
+        me.follow(b)
+        b.follow(me)
+        c.follow(me)
+        db.session.commit()
+        ids = [a.id, b.id, c.id, 999]
+        me.id  # reload after the commit
+        with self.app.test_request_context():
+            with assert_num_queries(self, 1):
+                states = me.follow_states(ids)
+                self.assertEqual(me.follow_states(ids), states)
+        self.assertEqual(states[a.id], (True, False))
+        self.assertEqual(states[b.id], (True, True))
+        self.assertEqual(states[c.id], (False, True))
+        self.assertEqual(states[999], (False, False))
+
+    def test_follow_forgets_cached_state(self):
+        me, a = self.users[:2]
+        with self.app.test_request_context():
+            self.assertFalse(me.follow_states([a.id])[a.id].following)
+            me.follow(a)
+            db.session.commit()
+            self.assertTrue(me.follow_states([a.id])[a.id].following)
+            self.assertTrue(a.follow_states([me.id])[me.id].followed_by)
+
+    def test_pages(self):
+        me, a, b = self.users[:3]
+        a.follow(me)
+        b.follow(me)
+        me.follow(a)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'user0@example.com', 'password': 'cat'})
+        response = client.get('/followers/user0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'Follows you'), 2)
+        self.assertEqual(response.data.count(b'>Unfollow<'), 1)
+        response = client.get('/user/user1')
+        self.assertIn(b'Follows you', response.data)
+        self.assertIn(b'Unfollow', response.data)
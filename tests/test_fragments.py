@@ -0,0 +1,81 @@
+import re
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+from app.main.fragments import fragment_cache
+
+
+class PostFragmentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        fragment_cache.clear()
+        self.author = User(email='john@example.com', username='john', password='cat')
+        self.post = Post(body='first *draft*', author=self.author)
+        db.session.add(self.post)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        fragment_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def index(self):
+        db.session.remove()
+        return self.client.get('/').get_data(as_text=True)
+
+    def test_fragment_is_reused(self):
+        self.index()
+        hits = fragment_cache.stats()['hits']
+        html = self.index()
+        self.assertEqual(fragment_cache.stats()['hits'], hits + 1)
+        self.assertIn('first <em>draft</em>', html)
+        self.assertNotIn('Edit', html)
+
+    def test_edit_bumps_version(self):
+        self.index()
+        post = Post.query.first()
+        post.body = 'second draft'
+        db.session.commit()
+        self.assertEqual(post.version, 1)
+        self.assertIn('second draft', self.index())
+
+    def test_concurrent_bumps_are_not_lost(self):
+        post = Post.query.first()
+        self.assertEqual(post.version, 0)
+        # a comment committed elsewhere after this post was loaded
+        posts = Post.__table__
+        db.session.execute(posts.update().values(**Post.bumped_version()))
+        post.body = 'second draft'
+        db.session.commit()
+        self.assertEqual(post.version, 2)
+
+    def test_comment_bumps_version(self):
+        self.index()
+        post = Post.query.first()
+        db.session.add(Comment(body='nice', post=post, author=post.author))
+        db.session.commit()
+        self.assertEqual(post.version, 1)
+        self.assertTrue(re.search(r'1 Comments', self.index()))
+
+    def test_author_change_bumps_version(self):
+        self.index()
+        post = Post.query.first()
+        post.author.username = 'johnny'
+        db.session.commit()
+        self.assertEqual(post.version, 1)
+        self.assertIn('/user/johnny', self.index())
+
+    def test_unrelated_profile_change_keeps_version(self):
+        self.author.about_me = 'hello'
+        db.session.commit()
+        self.assertEqual(self.post.version, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
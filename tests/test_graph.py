@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from base64 import b64encode
+from app import create_app, db
+from app.graph import follow_graph, FollowGraph
+from app.models import User, Role
+
+
+class FollowGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.users = [User(email='user%d@example.com' % i, username='user%d' % i,
+                           password='cat', confirmed=True) for i in range(6)]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def follow(self, *pairs):
+        for a, b in pairs:
+            self.users[a].follow(self.users[b])
+        db.session.commit()
+
+    def ids(self, *indexes):
+        return [self.users[i].id for i in indexes]
+
+    def load(self):
+        follow_graph.refresh()
+        follow_graph.wait()
+
+    def test_build(self):
+        self.follow((0, 1), (0, 2), (2, 1), (2, 2))
+        sources, offsets, targets = FollowGraph.build()
+        self.assertEqual(list(sources), self.ids(0, 2))
+        self.assertEqual(list(offsets), [0, 2, 3])
+        self.assertEqual(list(targets), self.ids(1, 2, 1))
+
+    def test_suggestions(self):
+        self.follow((0, 1), (0, 2), (1, 3), (2, 3), (2, 4), (1, 2))
+        self.load()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(3, 4))
+        self.assertEqual(follow_graph.suggestions(self.users[5].id), [])
+
+    def test_incremental_changes(self):
+        self.follow((0, 1), (1, 2))
+        self.load()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2))
+        self.follow((1, 3))
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2, 3))
+        self.users[0].unfollow(self.users[1])
+        db.session.commit()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), [])
+        self.users[0].follow(self.users[1])
+        db.session.rollback()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), [])
+
+    def test_snapshot(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, 'graph.pickle')
+        self.follow((0, 1), (1, 2))
+        FollowGraph.save(path, FollowGraph.build(), 0)
+        self.app.config['FLASKY_FOLLOW_GRAPH_PATH'] = path
+        # changes committed after the snapshot was built stay applied
+        self.follow((1, 4))
+        self.load()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2, 4))
+
+    def test_builds_in_background(self):
+        self.follow((0, 1), (1, 2))
+        # the first request only starts the build
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), [])
+        follow_graph.wait()
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2))
+        self.app.config['FLASKY_FOLLOW_GRAPH_MAX_AGE'] = 0
+        self.follow((2, 3))
+        # stale arrays are still served while the rebuild runs
+        self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2))
+        follow_graph.wait()
+
+    def test_fanout_is_sampled(self):
+        self.follow((0, 1), *((1, b) for b in range(2, 6)))
+        self.load()
+        with mock.patch('app.graph.MAX_FANOUT', 2):
+            self.assertEqual(follow_graph.suggestions(self.users[0].id), self.ids(2, 4))
+
+    def test_views(self):
+        self.follow((0, 1), (1, 2))
+        self.load()
+        client = self.app.test_client()
+        headers = {'Authorization': 'Basic ' + b64encode(b'user0@example.com:cat').decode('utf-8'),
+                   'Accept': 'application/json'}
+        response = client.get('/api/v1/users/%d/suggestions/?fields=username' % self.users[0].id,
+                              headers=headers)
+        self.assertEqual(response.get_json()['users'], [{'username': 'user2'}])
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client.post('/auth/login', data={'email': 'user0@example.com', 'password': 'cat'})
+        response = client.get('/user/user0')
+        self.assertIn(b'Who to follow', response.data)
+        self.assertIn(b'/follow/user2', response.data)
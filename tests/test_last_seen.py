@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Role
+from app.last_seen import LastSeenBuffer
+
+
+class LastSeenBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL'] = 3600
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.long_ago = datetime(2020, 1, 1)
+        self.u1 = User(email='john@example.com', username='john', password='cat', last_seen=self.long_ago)
+        self.u2 = User(email='susan@example.com', username='susan', password='dog', last_seen=self.long_ago)
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+        self.buffer = LastSeenBuffer()
+        self.buffer.init_app(self.app)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_touch_is_buffered(self):
+        self.buffer.touch(self.u1)
+        db.session.expire_all()
+        self.assertEqual(self.u1.last_seen, self.long_ago)
+        self.assertEqual(self.buffer.flush(), 1)
+        db.session.expire_all()
+        self.assertTrue(self.u1.last_seen > self.long_ago)
+        self.assertEqual(self.u2.last_seen, self.long_ago)
+
+    def test_granularity(self):
+        self.buffer.touch(self.u1)
+        self.buffer.touch(self.u2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.buffer.touch(self.u1)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.recorded[self.u1.id] -= timedelta(minutes=5)
+        self.buffer.touch(self.u1)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_flush_when_due(self):
+        self.app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL'] = 0
+        self.buffer.touch(self.u1)
+        self.assertEqual(self.buffer.pending, {})
+        db.session.expire_all()
+        self.assertTrue(self.u1.last_seen > self.long_ago)
+
+
+if __name__ == '__main__':
+    unittest.main()
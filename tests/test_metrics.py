@@ -0,0 +1,79 @@
+import unittest
+from unittest import mock
+from app import create_app, db
+from app.models import User, Role, Post
+from app.metrics import prometheus_client
+from config import TestingConfig
+
+
+@unittest.skipIf(prometheus_client is None, 'prometheus_client is not installed')
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @staticmethod
+    def sample(name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_metrics(self):
+        labels = {'method': 'GET', 'endpoint': 'main.index'}
+        before = self.sample('flasky_http_requests_total', status='200', **labels)
+        count = self.sample('flasky_http_request_duration_seconds_count', **labels)
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(self.sample('flasky_http_requests_total', status='200', **labels), before + 2)
+        self.assertEqual(self.sample('flasky_http_request_duration_seconds_count', **labels), count + 2)
+
+        missing = self.sample('flasky_http_requests_total', method='GET', endpoint='none', status='404')
+        self.client.get('/no-such-page')
+        self.assertEqual(self.sample('flasky_http_requests_total', method='GET', endpoint='none', status='404'),
+                         missing + 1)
+
+    def test_render_and_pool_metrics(self):
+        renders = self.sample('flasky_markdown_render_seconds_count')
+        checkouts = self.sample('flasky_db_pool_checkout_wait_seconds_count')
+        user = User(email='john@example.com', username='john', password='cat')
+        db.session.add_all([user, Post(body='a *new* post', author=user)])
+        db.session.commit()
+        db.session.remove()
+        User.query.count()
+        self.assertEqual(self.sample('flasky_markdown_render_seconds_count'), renders + 1)
+        self.assertGreater(self.sample('flasky_db_pool_checkout_wait_seconds_count'), checkouts)
+        db.session.remove()
+        db.engine.dispose()
+        checkouts = self.sample('flasky_db_pool_checkout_wait_seconds_count')
+        db.session.execute('SELECT 1')
+        self.assertGreater(self.sample('flasky_db_pool_checkout_wait_seconds_count'), checkouts)
+
+    def test_export(self):
+        self.client.get('/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('flasky_http_requests_total{endpoint="main.index",method="GET",status="200"}', text)
+        self.assertIn('flasky_mail_queue_depth 0.0', text)
+
+    def test_export_is_private(self):
+        client = self.app.test_client()
+        self.assertEqual(client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code, 404)
+        with mock.patch.object(TestingConfig, 'FLASKY_METRICS_ALLOW', ['203.0.113.0/24']):
+            app = create_app('testing')
+        client = app.test_client()
+        self.assertEqual(client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code, 200)
+        self.assertEqual(client.get('/metrics').status_code, 404)
+
+    def test_disabled(self):
+        with mock.patch.object(TestingConfig, 'FLASKY_METRICS', False):
+            app = create_app('testing')
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
@@ -0,0 +1,80 @@
+import base64
+import json
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Role, Post
+from app.pagination import keyset_paginate, encode_cursor, decode_cursor
+from app.main.fragments import fragment_cache
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        now = datetime.utcnow()
+        # pairs of posts share a timestamp so the id tie-breaker is exercised
+        self.posts = [Post(body='post %d' % i, author=u, timestamp=now - timedelta(minutes=i // 2))
+                      for i in range(7)]
+        db.session.add_all(self.posts)
+        db.session.commit()
+        self.expected = sorted(self.posts, key=lambda p: (p.timestamp, p.id), reverse=True)
+
+    def tearDown(self):
+        fragment_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cursor_round_trip(self):
+        key = (datetime(2020, 8, 1, 12, 30, 5), 42)
+        self.assertEqual(decode_cursor(encode_cursor('next', key)), ('next', key))
+        with self.assertRaises(ValueError):
+            decode_cursor('garbage')
+        with self.assertRaises(ValueError):
+            # ["next", 5, 1]: a timestamp that is not a string
+            decode_cursor('WyJuZXh0IiwgNSwgMV0=')
+        for ident in (True, 10 ** 30, -1):
+            with self.assertRaises(ValueError):
+                decode_cursor(self.cursor('prev', ident))
+
+    def cursor(self, direction, ident):
+        raw = json.dumps([direction, '0001-01-01T00:00:00.000000', ident])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def test_walk_forward_and_back(self):
+        pages = []
+        pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id), per_page=3)
+        self.assertFalse(pagination.has_prev)
+        pages.append(pagination.items)
+        while pagination.has_next:
+            pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id),
+                                         pagination.next_cursor, per_page=3)
+            pages.append(pagination.items)
+        self.assertEqual([p for page in pages for p in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id),
+                                     pagination.prev_cursor, per_page=3)
+        self.assertEqual(pagination.items, pages[1])
+        pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id),
+                                     pagination.prev_cursor, per_page=3)
+        self.assertEqual(pagination.items, pages[0])
+        self.assertFalse(pagination.has_prev)
+        self.assertTrue(pagination.has_next)
+
+    def test_invalid_cursor_is_first_page(self):
+        pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id), 'bogus', per_page=3)
+        self.assertEqual(pagination.items, self.expected[:3])
+        pagination = keyset_paginate(Post.query, (Post.timestamp, Post.id), 'WyJuZXh0IiwgNSwgMV0=', per_page=3)
+        self.assertEqual(pagination.items, self.expected[:3])
+        for cursor in (self.cursor('prev', True), self.cursor('next', 10 ** 30)):
+            self.assertEqual(self.app.test_client().get('/?cursor=' + cursor).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
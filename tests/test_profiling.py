@@ -0,0 +1,72 @@
+import json
+import unittest
+from unittest import mock
+from app import create_app, db
+from app.models import User, Role, Post
+from config import TestingConfig
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(TestingConfig, 'FLASKY_SQL_PROFILING', True):
+            self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+        @self.app.route('/authors')
+        def authors():
+            return ', '.join(db.session.query(User).filter_by(id=post.author_id).one().username
+                             for post in Post.query.order_by(Post.id))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_posts(self, count):
+        users = [User(email='u{}@example.com'.format(i), username='u{}'.format(i), password='cat')
+                 for i in range(count)]
+        db.session.add_all(users + [Post(body='post', author=user) for user in users])
+        db.session.commit()
+
+    def test_headers(self):
+        self.add_posts(2)
+        response = self.client.get('/authors')
+        self.assertEqual(response.get_data(as_text=True), 'u0, u1')
+        self.assertEqual(response.headers['X-Query-Count'], '3')
+        timing = response.headers.get_all('Server-Timing')
+        self.assertTrue(timing[0].startswith('db;dur='))
+        self.assertIn('desc="3 queries"', timing[0])
+        self.assertTrue(timing[1].startswith('app;dur='))
+
+    def test_n_plus_one_logged(self):
+        self.add_posts(6)
+        with self.assertLogs('flasky.profiling', 'WARNING') as logs:
+            response = self.client.get('/authors')
+        self.assertEqual(response.headers['X-Query-Count'], '7')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'n_plus_one')
+        self.assertEqual(record['path'], '/authors')
+        self.assertEqual(record['queries'], 7)
+        self.assertEqual(len(record['repeated']), 1)
+        self.assertEqual(record['repeated'][0]['count'], 6)
+        self.assertIn('FROM users', record['repeated'][0]['statement'])
+        self.assertLessEqual(len(record['slowest']), self.app.config['FLASKY_PROFILING_SLOWEST'])
+
+    def test_slow_request_logged(self):
+        self.app.config['FLASKY_SLOW_REQUEST_THRESHOLD'] = 0
+        with self.assertLogs('flasky.profiling', 'WARNING') as logs:
+            self.client.get('/authors')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'slow_request')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['repeated'], [])
+
+    def test_disabled_by_default(self):
+        app = create_app('testing')
+        with app.app_context():
+            response = app.test_client().get('/auth/login')
+        self.assertNotIn('X-Query-Count', response.headers)
@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+import bleach
+from markdown import markdown
+from app import create_app, db
+from app.models import User, Role, Post, Comment, RenderedHtml
+from app.render import MarkdownRenderer, render_html, rerender, prune_stored
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_RENDER_STORE_MIN_LENGTH'] = 10
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.renderer = MarkdownRenderer()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_matches_bleach_pipeline(self):
+        source = '# Title\n\n*hi* <script>x</script> see http://example.com'
+        expected = bleach.linkify(bleach.clean(markdown(source, output_format='html'),
+                                               tags=Post.allowed_tags, strip=True))
+        self.assertEqual(render_html(source, Post.allowed_tags), expected)
+        self.assertEqual(render_html(source, Post.allowed_tags), expected)
+
+    def test_memory_and_stored_hits(self):
+        source = 'a reasonably long **post** body'
+        html = self.renderer.render(source, Post.allowed_tags)
+        self.assertEqual(self.renderer.render(source, Post.allowed_tags), html)
+        self.assertEqual(self.renderer.stats()['memory_hits'], 1)
+        self.assertEqual(RenderedHtml.query.count(), 1)
+
+        fresh = MarkdownRenderer()
+        self.assertEqual(fresh.render(source, Post.allowed_tags), html)
+        self.assertEqual(fresh.stats(), {'memory_hits': 0, 'stored_hits': 1, 'renders': 0, 'size': 1})
+
+    def test_policy_is_part_of_the_key(self):
+        source = '# a heading that is long'
+        self.assertIn('<h1>', self.renderer.render(source, Post.allowed_tags))
+        self.assertNotIn('<h1>', self.renderer.render(source, Comment.allowed_tags))
+        self.assertEqual(self.renderer.stats()['renders'], 2)
+
+    def test_version_is_part_of_the_key(self):
+        source = 'a reasonably long **post** body'
+        html = self.renderer.render(source, Post.allowed_tags)
+        with mock.patch('app.render._version', 'other'):
+            fresh = MarkdownRenderer()
+            self.assertEqual(fresh.render(source, Post.allowed_tags), html)
+            self.assertEqual(fresh.stats()['renders'], 1)
+        self.assertEqual(RenderedHtml.query.count(), 2)
+
+    def test_models_use_renderer(self):
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        p = Post(body='**bold**', author=u)
+        db.session.add(p)
+        db.session.commit()
+        self.assertEqual(p.body_html, '<p><strong>bold</strong></p>')
+        c = Comment(body='# no headings', post=p, author=u)
+        self.assertEqual(c.body_html, 'no headings')
+
+    def test_rerender(self):
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        posts = [Post(body='post *%d*' % i, author=u) for i in range(5)]
+        db.session.add_all(posts)
+        db.session.commit()
+        db.session.execute(Post.__table__.update().values(body_html='stale'))
+        db.session.commit()
+        progress = list(rerender(Post, chunk_size=2, workers=2, start_after=posts[0].id))
+        self.assertEqual(progress, [(posts[2].id, 2), (posts[4].id, 2)])
+        db.session.expire_all()
+        self.assertEqual(posts[0].body_html, 'stale')
+        self.assertEqual([p.body_html for p in posts[1:]],
+                         ['<p>post <em>%d</em></p>' % i for i in range(1, 5)])
+
+    def test_rerender_replaces_stored_html(self):
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        post = Post(body='a reasonably long **post** body', author=u)
+        db.session.add(post)
+        db.session.commit()
+        db.session.execute(RenderedHtml.__table__.update().values(html='stale'))
+        db.session.commit()
+        list(rerender(Post, workers=1))
+        self.assertEqual(MarkdownRenderer().render(post.body, Post.allowed_tags),
+                         '<p>a reasonably long <strong>post</strong> body</p>')
+        self.assertEqual(RenderedHtml.query.count(), 1)
+
+    def test_prune_stored(self):
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        post = Post(body='a reasonably long **post** body', author=u)
+        db.session.add(post)
+        db.session.commit()
+        post.body = 'the edited, still long body'
+        db.session.commit()
+        self.assertEqual(RenderedHtml.query.count(), 2)
+        self.assertEqual(prune_stored((Post, Comment), chunk_size=1), 1)
+        self.assertEqual(MarkdownRenderer().render(post.body, Post.allowed_tags), post.body_html)
+        self.assertEqual(prune_stored((Post, Comment)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from flask import request
+from app import create_app, db
+from app.models import User, Role
+from config import TestingConfig
+
+
+class RoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        primary = 'sqlite:///' + os.path.join(self.dir.name, 'primary.sqlite')
+        replica = 'sqlite:///' + os.path.join(self.dir.name, 'replica.sqlite')
+        with mock.patch.multiple(TestingConfig, SQLALCHEMY_DATABASE_URI=primary,
+                                 SQLALCHEMY_BINDS={'replica': replica}, FLASKY_DATABASE_REPLICAS=['replica'],
+                                 create=True):
+            self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.replica = db.get_engine(bind='replica')
+        db.create_all()
+        db.Model.metadata.create_all(self.replica)
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+        @self.app.route('/users', methods=['GET', 'POST'])
+        def users():
+            if request.args.get('write'):
+                db.session.add(User(email='new@example.com', username='new', password='cat'))
+                db.session.commit()
+            return ','.join(user.username for user in User.query.order_by(User.username))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.replica.dispose()
+        db.get_engine().dispose()
+        self.app_context.pop()
+        self.dir.cleanup()
+
+    def add_to_replica(self, username):
+        self.replica.execute(User.__table__.insert(), username=username, email=username + '@example.com')
+
+    def add_to_primary(self, username):
+        db.session.add(User(email=username + '@example.com', username=username, password='cat'))
+        db.session.commit()
+
+    def test_get_reads_replica(self):
+        self.add_to_primary('john')
+        self.add_to_replica('susan')
+        self.assertEqual(self.client.get('/users').get_data(as_text=True), 'susan')
+        self.assertEqual(self.client.post('/users').get_data(as_text=True), 'john')
+
+    def test_reads_outside_requests_use_primary(self):
+        self.add_to_primary('john')
+        self.add_to_replica('susan')
+        self.assertEqual([user.username for user in User.query], ['john'])
+
+    def test_read_your_writes(self):
+        self.add_to_replica('susan')
+        # reads after a write go to the primary, for the rest of the request and the next few seconds
+        self.assertEqual(self.client.get('/users?write=1').get_data(as_text=True), 'new')
+        self.assertEqual(self.client.get('/users').get_data(as_text=True), 'new')
+        with mock.patch('app.routing.time.time', return_value=10 ** 10):
+            self.assertEqual(self.client.get('/users').get_data(as_text=True), 'susan')
+
+    def test_engine_options(self):
+        options = self.app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        self.assertIn('pool_size', options)
+        # sqlite pools are not sized, but keep recycling
+        self.assertEqual(db.get_engine().pool._recycle, options['pool_recycle'])
@@ -0,0 +1,105 @@
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, Post, Comment, SearchTerm, SearchFrequency
+from app.search import tokenize, rank, reindex
+
+
+class SearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, *bodies):
+        posts = [Post(body=body, author=self.user) for body in bodies]
+        db.session.add_all(posts)
+        db.session.commit()
+        return posts
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Hello, *World*!'), ['hello', 'world'])
+        self.assertEqual(tokenize('flask 框架'), ['flask', '框', '架'])
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(tokenize('Café ÉCOLE Straße ﬁne'), ['cafe', 'ecole', 'strasse', 'fine'])
+
+    def test_accented_spellings(self):
+        post, = self.add('café and cafe, Straße or strasse')
+        self.assertEqual(rank(Post, 'CAFE'), [post.id])
+        self.assertEqual(rank(Post, 'straße'), [post.id])
+        self.assertEqual(db.session.query(SearchTerm.tf).filter_by(term='cafe').scalar(), 2)
+
+    def test_index_follows_edits_and_deletes(self):
+        post, = self.add('red apple')
+        self.assertEqual(rank(Post, 'apple'), [post.id])
+        post.body = 'green pear'
+        db.session.commit()
+        self.assertEqual(rank(Post, 'apple'), [])
+        self.assertEqual(rank(Post, 'pear'), [post.id])
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(SearchTerm.query.count(), 0)
+
+    def frequencies(self):
+        return dict(db.session.query(SearchFrequency.term, SearchFrequency.df).
+                    filter(SearchFrequency.df > 0))
+
+    def test_document_frequencies(self):
+        first, second = self.add('apple apple pear', 'apple')
+        self.assertEqual(self.frequencies(), {'apple': 2, 'pear': 1})
+        first.body = 'pear plum'
+        db.session.commit()
+        self.assertEqual(self.frequencies(), {'apple': 1, 'pear': 1, 'plum': 1})
+        db.session.delete(second)
+        db.session.commit()
+        self.assertEqual(self.frequencies(), {'pear': 1, 'plum': 1})
+        db.session.query(SearchFrequency).delete()
+        db.session.commit()
+        self.assertEqual(sum(reindex(Post)), 1)
+        self.assertEqual(self.frequencies(), {'pear': 1, 'plum': 1})
+
+    def test_ranking(self):
+        one, both, twice = self.add('apple pie', 'apple and pear', 'pear pear apple')
+        self.add('banana')
+        self.assertEqual(rank(Post, 'pear apple'), [twice.id, both.id])
+        self.assertEqual(rank(Post, 'apple cherry'), [])
+        self.assertEqual(rank(Post, '!!'), [])
+
+    def test_comments_are_separate(self):
+        post, = self.add('apple')
+        comment = Comment(body='apple too', post=post, author=self.user)
+        db.session.add(comment)
+        db.session.commit()
+        self.assertEqual(rank(Post, 'too'), [])
+        self.assertEqual(rank(Comment, 'apple'), [comment.id])
+
+    def test_reindex(self):
+        posts = self.add('apple', 'pear')
+        db.session.query(SearchTerm).delete()
+        db.session.commit()
+        self.assertEqual(sum(reindex(Post, chunk_size=1)), 2)
+        self.assertEqual(rank(Post, 'pear'), [posts[1].id])
+
+    def test_views(self):
+        self.add('searchable words', 'other words')
+        client = self.app.test_client()
+        response = client.get('/search?q=searchable')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'searchable words', response.data)
+        self.assertNotIn(b'other words', response.data)
+        headers = {'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8'),
+                   'Accept': 'application/json'}
+        response = client.get('/api/v1/search?q=words', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['posts']), 2)
+        self.assertEqual(client.get('/api/v1/search', headers=headers).status_code, 400)
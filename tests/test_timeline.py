@@ -0,0 +1,64 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_post(self, author, body):
+        p = Post(body=body, author=author)
+        db.session.add(p)
+        db.session.commit()
+        return p
+
+    def test_own_posts_in_timeline(self):
+        p = self.add_post(self.u1, 'mine')
+        self.assertEqual(self.u1.followed_posts.all(), [p])
+        self.assertEqual(self.u2.followed_posts.all(), [])
+
+    def test_fan_out_to_followers(self):
+        self.u1.follow(self.u2)
+        db.session.commit()
+        p = self.add_post(self.u2, 'hello')
+        self.assertEqual(self.u1.followed_posts.all(), [p])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        p1 = self.add_post(self.u2, 'first')
+        p2 = self.add_post(self.u2, 'second')
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual(set(self.u1.followed_posts.all()), {p1, p2})
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.followed_posts.all(), [])
+        self.assertEqual(set(self.u2.followed_posts.all()), {p1, p2})
+
+    def test_rebuild(self):
+        self.u1.follow(self.u2)
+        db.session.commit()
+        p1 = self.add_post(self.u1, 'mine')
+        p2 = self.add_post(self.u2, 'theirs')
+        Timeline.query.delete()
+        db.session.commit()
+        Timeline.rebuild()
+        self.assertEqual(set(self.u1.followed_posts.all()), {p1, p2})
+        self.assertEqual(self.u2.followed_posts.all(), [p2])
+
+
+if __name__ == '__main__':
+    unittest.main()
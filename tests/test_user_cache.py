@@ -0,0 +1,67 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Permission, load_user, user_cache
+from helpers import assert_num_queries
+
+
+class UserCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_USER_CACHE_TTL'] = 60
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user_cache.clear()
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.user_id = u.id
+        db.session.remove()
+
+    def tearDown(self):
+        user_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cached_load_costs_no_queries(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        hits = user_cache.stats()['hits']
+        with assert_num_queries(self, 0):
+            u = load_user(str(self.user_id))
+            self.assertEqual(u.username, 'john')
+            self.assertTrue(u.can(Permission.WRITE))
+            self.assertFalse(u.is_administrator())
+        self.assertEqual(user_cache.stats()['hits'], hits + 1)
+
+    def test_volatile_columns_are_fresh(self):
+        load_user(str(self.user_id))
+        db.session.execute(User.__table__.update().values(followers_count=3))
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(load_user(str(self.user_id)).followers_count, 3)
+
+    def test_profile_change_invalidates(self):
+        u = load_user(str(self.user_id))
+        u.name = 'John Smith'
+        u.password = 'dog'
+        db.session.add(u)
+        db.session.commit()
+        db.session.remove()
+        u = load_user(str(self.user_id))
+        self.assertEqual(u.name, 'John Smith')
+        self.assertTrue(u.verify_password('dog'))
+
+    def test_role_change_invalidates(self):
+        load_user(str(self.user_id))
+        role = Role.query.filter_by(name='User').first()
+        role.remove_permission(Permission.WRITE)
+        db.session.commit()
+        db.session.remove()
+        self.assertFalse(load_user(str(self.user_id)).can(Permission.WRITE))
+
+
+if __name__ == '__main__':
+    unittest.main()